@@ -13,6 +13,12 @@ PRETTY_PRINT = False  # When True, truncates memory content in prompt logging
 HOURS = 5
 TWEETS = 100
 
+# Run memory insertion and log writes in the background so they overlap the next LLM call
+PIPELINE_BACKGROUND_WRITES = True
+
+# Span tracing (JSONL) and a Prometheus-text metrics snapshot, rewritten after every cycle
+TELEMETRY_ENABLED = True
+
 #######################################
 # FILE PATHS
 #######################################
@@ -22,11 +28,16 @@ MEMORY_DB_PATH = "testing/memory_db/index.faiss" if TESTING else "live/memory_db
 
 # Perception data paths
 PERCEPTIONS_FILE_PATH = "testing/perception_tweets.txt" if TESTING else "live/perception_tweets.txt"
+PERCEPTIONS_INDEX_DIR = "testing/perception_index" if TESTING else "live/perception_index"
 
 # State of mind storage
 STATE_OF_MIND_PATH = "testing/state_of_mind.json" if TESTING else "live/state_of_mind.json"
 STATE_OF_MIND_SEED = "I am a curious observer with a budding sense of self."
 
+# Telemetry output
+TRACE_PATH = "testing/telemetry/trace.jsonl" if TESTING else "live/telemetry/trace.jsonl"
+METRICS_PATH = "testing/telemetry/metrics.prom" if TESTING else "live/telemetry/metrics.prom"
+
 # Reddit data cache
 REDDIT_CACHE_DIR = "cache/reddit_cache"
 
@@ -36,6 +47,41 @@ GENERATED_TWEETS_PATH = "testing/generated_tweets.txt" if TESTING else "live/gen
 # LLM model path
 LLAMA_MODEL_PATH = "ggufs/MythoMax-L2-13B-GGUF.gguf"
 
+# LLM response cache for record/replay runs: "off", "record" (generate and save every completion)
+# or "replay" (serve saved completions, generating and saving only misses)
+LLM_CACHE_MODE = "off"
+LLM_CACHE_PATH = "testing/llm_responses.bin" if TESTING else "live/llm_responses.bin"
+
+# Sampling seed passed to llama.cpp (None = llama.cpp default); part of the response cache key
+LLM_SEED = None
+
+# Seed for Python/numpy randomness (schedule, tweet modes, post sampling). Replaying a recorded run
+# end to end needs the same prompts, so record and replay with the same RANDOM_SEED and with
+# PERCEPTION_PREFETCH_DEPTH = 0 (the prefetch thread would interleave its draws with the main loop)
+RANDOM_SEED = None
+
+# Number of saved llama states for shared prompt prefixes (identity + instruction); 0 disables
+LLM_PREFIX_CACHE_SIZE = 4
+
+#######################################
+# EMBEDDING SETTINGS
+#######################################
+
+# Sentence-transformers model used for all embeddings (also part of the embedding cache key)
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Embedding cache: in-memory LRU entries, and disk tier directory (None disables the disk tier)
+EMBEDDING_CACHE_SIZE = 4096
+# Disk tier entries (~1.5 KB each at 384 dims); when full it is compacted to the half most recently
+# used or written. None leaves it unbounded
+EMBEDDING_CACHE_DISK_SIZE = 200_000
+EMBEDDING_CACHE_DIR = "cache/embedding_cache"
+
+# Texts per forward pass for bulk embedding (embed_texts)
+EMBEDDING_BATCH_SIZE = 64
+# Worker processes for bulk embedding on CPU (0 or 1 disables the multi-process pool)
+EMBEDDING_PROCESSES = 0
+
 #######################################
 # BEHAVIOR SETTINGS
 #######################################
@@ -43,12 +89,44 @@ LLAMA_MODEL_PATH = "ggufs/MythoMax-L2-13B-GGUF.gguf"
 # Perception source settings (twitter, reddit, or both)
 PERCEPTION_SOURCES = ["twitter", "reddit"]
 REDDIT_PERCEPTION_CHANCE = 1 # Probability of choosing Reddit over Twitter
+# Perception items prepared ahead in a background thread (0 = prepare inline)
+PERCEPTION_PREFETCH_DEPTH = 2
 
 # Reflection settings
 REFLECTION_CHANCE = 0.5
 SHOULD_FORCE_REFLECTION_AFTER_K_CYCLES = True
 FORCE_REFLECTION_AFTER_K = 3
 
+# Memory storage settings
+# Precision of stored memory vectors ("float32" or "float16"; float16 halves the footprint)
+MEMORY_VECTOR_DTYPE = "float32"
+# Group commit: the write-ahead log is fsynced every N new memories, or (by a timer) at most this
+# many seconds after the first unsynced one
+MEMORY_WAL_FSYNC_EVERY = 8
+MEMORY_WAL_FSYNC_INTERVAL = 2.0
+# Full snapshots (store checkpoint + FAISS index write) every N new memories or this many seconds
+MEMORY_SNAPSHOT_EVERY = 500
+MEMORY_SNAPSHOT_INTERVAL = 600.0
+# FAISS index type by hot memory count (inner product over normalised vectors, i.e. cosine):
+# exact "flat" below the first threshold, then each (min_count, kind) tier, built in the background.
+# With tiering on, the hot window holds at most MEMORY_HOT_WINDOW + MEMORY_ARCHIVE_BATCH memories,
+# so the HNSW tier must start below that; the IVF-PQ tier only applies with MEMORY_HOT_WINDOW = None
+MEMORY_INDEX_TIERS = [(20_000, "hnsw"), (2_000_000, "ivfpq")]
+MEMORY_INDEX_HNSW_M = 32         # graph neighbours per node
+MEMORY_INDEX_EF_SEARCH = 64      # HNSW search breadth (higher = better recall, slower)
+MEMORY_INDEX_PQ_M = 16           # PQ sub-quantizers (rounded down to a divisor of the vector dim)
+MEMORY_INDEX_NPROBE = 16         # IVF lists scanned per query
+# New memories at least this cosine-similar to an existing one are merged into it (hit count +
+# provenance in the metadata log) instead of stored as another vector; None disables merging.
+# A merged memory counts as seen again: retrieval recency and reflection treat it as new
+MEMORY_CONSOLIDATE_THRESHOLD = 0.95
+# Hot/cold tiering: the newest MEMORY_HOT_WINDOW memories stay at full precision in the FAISS index;
+# once the window overflows by MEMORY_ARCHIVE_BATCH, older ones move (in the background) to a cold
+# tier of product-quantised codes searched on demand. None keeps every memory hot
+MEMORY_HOT_WINDOW = 50_000
+MEMORY_ARCHIVE_BATCH = 10_000
+MEMORY_COLD_PQ_M = 48            # bytes per archived memory (rounded down to a divisor of the vector dim)
+
 # Memory retrieval settings
 NUM_MEMORIES_FOR_TWEET = 5
 # Maximum cosine similarity allowed between memories (lower = more diverse)
@@ -58,6 +136,11 @@ SIMILARITY_THRESHOLD = 0.9
 DEFAULT_SUBREDDITS = ["philosophy", "Futurology", "artificial", "slatestarcodex", "consciousness"]
 DEFAULT_TIME_RANGE = "2012-2016"
 
+# Subreddit suggestion index: exact flat search up to this many names, HNSW graph above it
+SUBREDDIT_INDEX_FLAT_MAX = 50_000
+SUBREDDIT_INDEX_HNSW_M = 32
+SUBREDDIT_INDEX_EF_SEARCH = 64
+
 # Reddit post quality filters
 MIN_SCORE = 0  # Minimum upvote score for Reddit posts
 MIN_BODY_LENGTH = 50  # Minimum length of post body
@@ -84,6 +167,27 @@ TWEET_MAX_TOKENS = {
     "long": 2000
 }
 
+# Streaming stop criteria by tweet length: generation stops once the tweet is longer than the
+# character budget (a little above the prompt's limit, to allow for a "Tweet:" label and quotes)
+# or when the model starts a new tweet or prompt section
+TWEET_CHAR_BUDGET = {
+    "short": 300,
+    "medium": 2050,
+    "long": 7050
+}
+# Length limits the tweet prompts promise; after generation a tweet is stripped of any "Tweet:"
+# label and quotes, then ended on the last sentence (or word) boundary within its limit
+TWEET_CHAR_LIMIT = {
+    "short": 280,
+    "medium": 2000,
+    "long": 7000
+}
+TWEET_STOP_DELIMITERS = {
+    "short": ["\n", "Tweet:"],
+    "medium": ["Tweet:", "\n["],
+    "long": ["Tweet:", "\n["]
+}
+
 #######################################
 # PROMPTS
 #######################################
@@ -139,6 +243,21 @@ REFLECTION_PROMPT_WITH_REDDIT = (
     "}"
 )
 
+# JSON schema the Reddit reflection is decoded under (as a llama.cpp grammar), so the reply
+# always parses and has the keys update_state_from_json expects
+REFLECTION_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "followed_subreddits": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["summary", "followed_subreddits"],
+    "additionalProperties": False
+}
+
+# Token limit for the JSON reflection (generation stops as soon as the object closes)
+REFLECTION_MAX_TOKENS = 512
+
 # Tweet generation prompts
 TWEET_LENGTH_PROMPTS = {
     "short": "Write ONE short tweet (MUST BE less than 280 characters). Output ONLY the tweet.",
@@ -0,0 +1,373 @@
+# benchmark.py
+# End-to-end performance benchmark with a stub LLM and embedder.
+#
+# The llama.cpp model and the sentence-transformers embedder are swapped for deterministic local
+# stubs, so the timings cover everything *except* model inference: prompt building, memory
+# retrieval and insertion, perception sampling, state handling and file I/O. For each memory size
+# a fresh memory DB is seeded with synthetic memories, and the phases and memory operations are
+# timed. Reddit sampling runs against a synthetic Arrow dataset. Everything is written to a
+# temporary directory; results are saved as JSON so runs can be compared between commits.
+#
+# Usage: python benchmark.py [--sizes 1000 10000 100000 1000000] [--repeat 5] [--output FILE]
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import hashlib
+import platform
+import statistics
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import numpy as np
+
+import config
+
+# Module-level singletons (memory DB, embedding and LLM caches, perception corpus, Reddit cache,
+# state of mind, telemetry) take their paths from config when imported, so the paths point into
+# the temporary work directory before those modules are imported
+WORK_DIR = tempfile.mkdtemp(prefix="bot-benchmark-")
+config.MEMORY_DB_PATH = os.path.join(WORK_DIR, "memory_db", "index.faiss")
+config.PERCEPTIONS_FILE_PATH = os.path.join(WORK_DIR, "perception_tweets.txt")
+config.PERCEPTIONS_INDEX_DIR = os.path.join(WORK_DIR, "perception_index")
+config.STATE_OF_MIND_PATH = os.path.join(WORK_DIR, "state_of_mind.json")
+config.TRACE_PATH = os.path.join(WORK_DIR, "telemetry", "trace.jsonl")
+config.METRICS_PATH = os.path.join(WORK_DIR, "telemetry", "metrics.prom")
+config.REDDIT_CACHE_DIR = os.path.join(WORK_DIR, "reddit_cache")
+config.GENERATED_TWEETS_PATH = os.path.join(WORK_DIR, "generated_tweets.txt")
+config.LLM_CACHE_MODE = "off"
+config.LLM_CACHE_PATH = os.path.join(WORK_DIR, "llm_responses.bin")
+config.EMBEDDING_CACHE_DIR = None
+
+import model
+import memory
+import reflection
+import tweet_phase
+import perception
+import state_of_mind
+import reddit_perception
+import subreddit_search
+from memory import MemoryDB
+from embedding_cache import EmbeddingCache
+from llm_cache import LLMResponseCache
+from pipeline import wait_for_background_writes
+from seen_posts import SeenPostTracker
+from subreddit_index_builder import filter_quality_batch
+from subreddit_post_index import SubredditPostIndex
+from subreddit_search import SubredditIndex
+from telemetry import telemetry
+
+default_memory_db = memory.memory_db  # the (empty) singleton, replaced per size by install_memory_db
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+REDDIT_ROWS = 100_000
+BENCH_SUBREDDITS = [f"bench{i}" for i in range(10)]
+SEED_CHUNK_ROWS = 100_000
+WORDS = ("mind memory signal pattern quiet network self thought echo light model dream "
+         "language time question machine curious drift noise meaning").split()
+
+
+# --------------------------------------------------------------------------------------
+# Stubs
+# --------------------------------------------------------------------------------------
+
+def _text_rng(text):
+    return random.Random(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest())
+
+
+class StubDevice:
+    type = "cpu"
+
+
+class StubEmbedder:
+    """Deterministic stand-in for SentenceTransformer: a unit vector seeded by the text."""
+    device = StubDevice()
+
+    def get_sentence_embedding_dimension(self):
+        return EMBEDDING_DIM
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        if isinstance(texts, str):
+            return self._embed(texts)
+        return np.stack([self._embed(t) for t in texts]) if texts else np.zeros((0, EMBEDDING_DIM), np.float32)
+
+
+class StubLlama:
+    """Deterministic stand-in for llama_cpp.Llama covering what model.py uses."""
+
+    def __init__(self):
+        self.input_ids = np.zeros(0, dtype=np.int64)
+        self.n_tokens = 0
+
+    # Prefix state cache API
+    def tokenize(self, data, add_bos=True, special=False):
+        return ([1] if add_bos else []) + list(data)
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.input_ids = np.concatenate([self.input_ids[:self.n_tokens], np.asarray(tokens, dtype=np.int64)])
+        self.n_tokens = len(self.input_ids)
+
+    def save_state(self):
+        return self.input_ids[:self.n_tokens].copy()
+
+    def load_state(self, state):
+        self.input_ids = state.copy()
+        self.n_tokens = len(state)
+
+    # Completion API
+    def _reply(self, prompt, max_tokens, grammar):
+        rng = _text_rng(prompt)
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, max(5, min(max_tokens, 60))))]
+        if grammar is not None:
+            return json.dumps({
+                "summary": " ".join(words[:30]),
+                "followed_subreddits": rng.sample(BENCH_SUBREDDITS, 5),
+            })
+        text = " ".join(words)
+        return ("Tweet: " + text) if "tweet" in prompt.lower() else text
+
+    def create_completion(self, prompt, temperature=0.7, max_tokens=128, stream=False, grammar=None, **kwargs):
+        reply = self._reply(prompt, max_tokens, grammar)
+        if not stream:
+            return {"choices": [{"text": reply}]}
+        return ({"choices": [{"text": reply[i:i + 4]}]} for i in range(0, len(reply), 4))
+
+
+# --------------------------------------------------------------------------------------
+# Synthetic data
+# --------------------------------------------------------------------------------------
+
+def seed_memory_db(db_dir, size):
+    """Create a memory DB with `size` synthetic memories, written directly to the store."""
+    db = MemoryDB(dim=EMBEDDING_DIM, db_path=os.path.join(db_dir, "index.faiss"))
+    rng = np.random.default_rng(size)
+    vectors = np.empty((size, EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, size, SEED_CHUNK_ROWS):
+        chunk = rng.standard_normal((min(SEED_CHUNK_ROWS, size - start), EMBEDDING_DIM)).astype(np.float32)
+        vectors[start:start + len(chunk)] = memory.normalize(chunk)
+    log_lines = [
+        (json.dumps({
+            "response_type": "tweet" if i % 3 == 0 else "reddit_perception",
+            "response": f"synthetic memory {i}: " + " ".join(WORDS[(i + j) % len(WORDS)] for j in range(12)),
+            "timestamp": datetime(2025, 1, 1).isoformat(),
+        }) + "\n").encode("utf-8")
+        for i in range(size)
+    ]
+    db.store.dim = EMBEDDING_DIM
+    db.store.create_from(vectors, log_lines)
+    db._index = None
+    return db
+
+
+def build_reddit_dataset(rows, index_dir):
+    """A synthetic Pushshift-like Arrow dataset and its subreddit post index."""
+    import datasets
+
+    rng = np.random.default_rng(0)
+    start = datetime(2012, 1, 1).timestamp()
+    end = datetime(2016, 12, 31).timestamp()
+    bodies = [" ".join(WORDS[(i + j) % len(WORDS)] for j in range(20 + i % 40)) for i in range(997)]
+    columns = {
+        "id": [f"p{i}" for i in range(rows)],
+        "subreddit": [BENCH_SUBREDDITS[i % len(BENCH_SUBREDDITS)] for i in range(rows)],
+        "title": [f"synthetic post {i}" for i in range(rows)],
+        "selftext": [bodies[i % len(bodies)] if i % 11 else "[deleted]" for i in range(rows)],
+        "score": rng.integers(-5, 100, rows).tolist(),
+        "created_utc": rng.integers(int(start), int(end), rows).tolist(),
+    }
+    dataset = datasets.Dataset.from_dict(columns)
+
+    started = time.perf_counter()
+    table = dataset.with_format("arrow")[0:rows]
+    subreddits, indices, years = filter_quality_batch(table, 0)
+    index = SubredditPostIndex.write(index_dir, subreddits.to_pylist(), indices, years)
+    build_seconds = time.perf_counter() - started
+    return dataset, index, build_seconds
+
+
+def write_perception_corpus(path, count=1000):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(f"[Tweet]\nAuthor: @bench{i % 50}\nText: synthetic perception {i} about "
+                    f"{WORDS[i % len(WORDS)]}\nTimestamp: 2025-01-01T00:00:00+00:00\nTweet ID: {i}\n\n---\n\n")
+
+
+# --------------------------------------------------------------------------------------
+# Harness
+# --------------------------------------------------------------------------------------
+
+def time_call(fn, repeat, quiet=True, setup=None):
+    """Run fn `repeat` times and return timing stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        sink = io.StringIO() if quiet else sys.stdout
+        with redirect_stdout(sink):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "min_ms": samples[0],
+        "max_ms": samples[-1],
+    }
+
+
+def with_writes(fn):
+    """Time a phase including the memory writes it leaves on the background writer."""
+    def run():
+        fn()
+        wait_for_background_writes()
+    return run
+
+
+def install_memory_db(db):
+    for module in (memory, model, tweet_phase, reflection):
+        module.memory_db = db
+
+
+def install_stubs(work_dir, dataset, post_index):
+    model._get_llm = lambda llm=StubLlama(): llm
+    model.get_embedding_model = lambda embedder=StubEmbedder(): embedder
+    model.embedding_cache = EmbeddingCache(model_id="benchmark-stub", disk_dir=None)
+    model.llm_cache = LLMResponseCache(mode="off")
+
+    state_of_mind.save_state_of_mind({"summary": "A synthetic benchmark identity.",
+                                      "followed_subreddits": BENCH_SUBREDDITS[:5]})
+    write_perception_corpus(config.PERCEPTIONS_FILE_PATH)
+
+    reddit_perception._local_dataset = dataset
+    reddit_perception._subreddit_index = post_index
+    reddit_perception._seen_posts = SeenPostTracker(config.REDDIT_CACHE_DIR)
+
+    embedder = StubEmbedder()
+    names = [f"sub{i}" for i in range(5000)] + BENCH_SUBREDDITS
+    subreddit_search._subreddit_index = SubredditIndex.build(names, np.stack([embedder._embed(n) for n in names]))
+
+    reflection.REFLECTION_CHANCE = 1.0
+
+
+def benchmark_size(size, repeat, work_dir):
+    results = {}
+    db_dir = os.path.join(work_dir, f"memory_db_{size}")
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        db = seed_memory_db(db_dir, size)
+    results["seed_seconds"] = time.perf_counter() - started
+    install_memory_db(db)
+
+    def build_index():
+        db.index
+        # Loading may start an archive to the cold tier and a tier rebuild; wait for them so the
+        # timings below don't run alongside background work
+        if db._index_builder is not None:
+            db._index_builder.join()
+
+    results["index_build"] = time_call(build_index, 1)
+    results["hot_memories"] = len(db) - db.hot_start
+    query_text = "what does memory feel like"
+    query = model.embed_text(query_text)
+
+    results["memory_search"] = time_call(lambda: db.search(query, k=5), repeat)
+    results["get_top_memories"] = time_call(lambda: tweet_phase.get_top_memories(query_text), repeat)
+    results["get_diverse_recent_memories"] = time_call(tweet_phase.get_diverse_recent_memories, repeat)
+    results["memory_add"] = time_call(
+        lambda: db.add(f"benchmark memory {time.perf_counter()}", query, response_type="benchmark"), repeat)
+
+    def ready_for_reflection():
+        reflection.last_reflection_mark = (db.store.offset(max(len(db) - 10, 0)), [])
+
+    results["perception_phase"] = time_call(with_writes(perception.perception_phase), repeat)
+    results["reflection_phase"] = time_call(with_writes(reflection.reflection_phase), repeat,
+                                            setup=ready_for_reflection)
+    results["tweet_phase"] = time_call(with_writes(tweet_phase.tweet_phase), repeat)
+
+    db.close()
+    install_memory_db(None)
+    shutil.rmtree(db_dir, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot pipeline with a stub LLM and embedder.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="memory DB sizes to seed")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per operation")
+    parser.add_argument("--reddit-rows", type=int, default=REDDIT_ROWS, help="rows in the synthetic dataset")
+    parser.add_argument("--output", default=None, help="JSON results file (default: benchmark_<commit>.json)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    work_dir = WORK_DIR
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "memory_vector_dtype": config.MEMORY_VECTOR_DTYPE,
+        "sizes": {},
+    }
+    try:
+        print(f"📦 Building synthetic Reddit dataset ({args.reddit_rows} rows)...")
+        with redirect_stdout(io.StringIO()):
+            dataset, post_index, build_seconds = build_reddit_dataset(
+                args.reddit_rows, os.path.join(work_dir, "subreddit_index"))
+            install_stubs(work_dir, dataset, post_index)
+        results["reddit"] = {
+            "rows": args.reddit_rows,
+            "index_build_seconds": build_seconds,
+            "get_random_post": time_call(reddit_perception.get_random_post, max(args.repeat, 20)),
+        }
+
+        for size in args.sizes:
+            print(f"⏱️ Benchmarking with {size} memories...")
+            results["sizes"][str(size)] = benchmark_size(size, args.repeat, work_dir)
+            for name, stats in results["sizes"][str(size)].items():
+                if isinstance(stats, dict):
+                    print(f"   {name:<28} median {stats['median_ms']:10.2f} ms   p95 {stats['p95_ms']:10.2f} ms")
+    finally:
+        perception._perception_prefetcher.stop()
+        telemetry.flush()
+        default_memory_db.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or f"benchmark_{(commit or 'local')[:12]}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Benchmark results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
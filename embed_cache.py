@@ -4,14 +4,15 @@
 import os
 import pickle
 import time
-from model import embed_text
+from model import embed_texts
+from subreddit_search import SubredditIndex, EMBEDDED_CACHE_FILENAME, INDEX_FILENAME
 
 # File paths
 INPUT_FILENAME = "cache/reddit_cache/subreddit_names.txt"
-OUTPUT_FILENAME = "cache/reddit_cache/embedded_subreddit_index.pkl"
+OUTPUT_FILENAME = EMBEDDED_CACHE_FILENAME
 
-# Batch size for processing
-BATCH_SIZE = 200
+# Names handed to embed_texts at a time (it sub-batches by EMBEDDING_BATCH_SIZE internally)
+BATCH_SIZE = 2000
 
 
 def load_subreddit_names():
@@ -29,8 +30,9 @@ def build_embeddings(subreddit_names):
     next_checkpoint = 5000
     for i in range(0, total, BATCH_SIZE):
         batch = subreddit_names[i:i+BATCH_SIZE]
-        # Compute embeddings for each subreddit in the batch
-        embeddings = [embed_text(name) for name in batch]
+        # Compute embeddings for the whole batch in batched forward passes; they are saved to
+        # the pickle below, so they stay out of the embedding cache's disk tier
+        embeddings = embed_texts(batch, persist=False)
         for name, embedding in zip(batch, embeddings):
             embeddings_dict[name] = embedding
         #print(f"Processed {min(i+BATCH_SIZE, total)}/{total} subreddits.")
@@ -67,6 +69,10 @@ def main():
     # Save embeddings
     save_embeddings(embeddings)
 
+    # Build the FAISS search index used for subreddit suggestions
+    SubredditIndex.from_embeddings_dict(embeddings).save()
+    print(f"Search index saved to {INDEX_FILENAME}")
+
     elapsed = (time.time() - start_time)/60
     print(f"Done in {elapsed:.2f} minutes.")
 
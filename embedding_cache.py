@@ -0,0 +1,206 @@
+# embedding_cache.py
+# Content-addressed cache for text embeddings: a bounded in-memory LRU tier backed by an
+# optional memory-mapped disk tier that survives restarts.
+#
+# Keys are a hash of (model id, text), so switching embedding models never returns stale vectors.
+# The disk tier lives in <EMBEDDING_CACHE_DIR>/<model id>/ as:
+#   meta.json    - model id and vector dim
+#   vectors.f32  - appended float32 rows, memory-mapped for reads
+#   keys.bin     - 16-byte digest per row, written after its vector (a row counts once its key exists)
+#
+# The disk tier holds at most `disk_capacity` rows. When it is full, it is rewritten with the half of
+# the rows most recently used (in the LRU tier) or written, and the old files are swapped out.
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DISK_SIZE
+
+KEY_BYTES = 16
+
+
+class EmbeddingCache:
+    def __init__(self, model_id=EMBEDDING_MODEL_NAME, capacity=EMBEDDING_CACHE_SIZE, disk_dir=EMBEDDING_CACHE_DIR,
+                 disk_capacity=EMBEDDING_CACHE_DISK_SIZE):
+        self.model_id = model_id
+        self.capacity = capacity
+        self.disk_capacity = disk_capacity
+        self._lru: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.disk_dir = None
+        self.dim: int | None = None
+        self._disk_rows: dict[bytes, int] = {}
+        self._disk_count = 0
+        self._disk_vectors: np.ndarray | None = None
+        if disk_dir:
+            safe_model_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_id)
+            self.disk_dir = os.path.join(disk_dir, safe_model_id)
+            self._open_disk()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.model_id}\0{text}".encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+    # ----------------------------------------------------------------------------------
+    # Lookup / insert
+    # ----------------------------------------------------------------------------------
+
+    def get(self, text: str) -> np.ndarray | None:
+        """Return the cached (read-only) embedding for text, or None on a miss."""
+        key = self.key(text)
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            row = self._disk_rows.get(key)
+            if row is not None:
+                vector = np.array(self._disk_view()[row])
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector, disk: bool = True) -> np.ndarray:
+        """Cache an embedding and return the read-only array that was stored.
+
+        With disk=False it only goes to the in-memory tier.
+        """
+        key = self.key(text)
+        vector = np.array(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        with self._lock:
+            self._remember(key, vector)
+            if disk and self.disk_dir and key not in self._disk_rows:
+                self._append_disk(key, vector)
+        return vector
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+                "disk_entries": self._disk_count,
+            }
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    # ----------------------------------------------------------------------------------
+    # Disk tier
+    # ----------------------------------------------------------------------------------
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.disk_dir, "vectors.f32")
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self.disk_dir, "keys.bin")
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.disk_dir, "meta.json")
+
+    def _open_disk(self):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        if not os.path.exists(self._meta_path) or not os.path.exists(self._keys_path):
+            return
+
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        # Raw bytes: a fixed-width "S" dtype would strip trailing NUL bytes from the digests
+        raw = np.fromfile(self._keys_path, dtype=np.uint8)
+        keys = raw[:len(raw) - len(raw) % KEY_BYTES].reshape(-1, KEY_BYTES)
+        vectors_size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+
+        # Rows are committed once their key is written; anything past that is overwritten later
+        self._disk_count = min(len(keys), vectors_size // (4 * self.dim))
+        self._disk_rows = {k.tobytes(): i for i, k in enumerate(keys[:self._disk_count])}
+        print(f"🗂️ Loaded embedding cache with {self._disk_count} vectors from {self.disk_dir}")
+
+    def _disk_view(self) -> np.ndarray:
+        if self._disk_vectors is None or len(self._disk_vectors) < self._disk_count:
+            self._disk_vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                           shape=(self._disk_count, self.dim))
+        return self._disk_vectors
+
+    def _append_disk(self, key, vector):
+        try:
+            if self.dim is None:
+                self.dim = len(vector)
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+            if len(vector) != self.dim:
+                return
+            if self.disk_capacity and self._disk_count >= self.disk_capacity:
+                self._compact_disk(max(self.disk_capacity // 2, 1) - 1)
+            with open(self._vectors_path, "r+b" if os.path.exists(self._vectors_path) else "wb") as f:
+                f.seek(self._disk_count * self.dim * 4)
+                f.write(vector.tobytes())
+            with open(self._keys_path, "r+b" if os.path.exists(self._keys_path) else "wb") as f:
+                f.seek(self._disk_count * KEY_BYTES)
+                f.write(key)
+        except OSError as e:
+            print(f"⚠️ Could not write embedding cache: {e}")
+            return
+        self._disk_rows[key] = self._disk_count
+        self._disk_count += 1
+
+    def _compact_disk(self, keep):
+        """Rewrite the disk tier with `keep` rows: those in the LRU tier first, then the newest.
+
+        The files are replaced rather than truncated, and the keys file goes first, so a crash
+        part-way leaves an empty tier rather than keys pointing at the wrong vectors.
+        """
+        in_memory = sorted(row for key, row in self._disk_rows.items() if key in self._lru)[-keep:] if keep else []
+        rows = set(in_memory)
+        for row in range(self._disk_count - 1, -1, -1):
+            if len(rows) >= keep:
+                break
+            rows.add(row)
+        rows = np.array(sorted(rows), dtype=np.int64)
+
+        keys = [None] * self._disk_count
+        for key, row in self._disk_rows.items():
+            keys[row] = key
+        kept_keys = [keys[row] for row in rows]
+        vectors = np.array(self._disk_view()[rows]) if len(rows) else np.zeros((0, self.dim), dtype=np.float32)
+
+        vectors.tofile(self._vectors_path + ".tmp")
+        with open(self._keys_path + ".tmp", "wb") as f:
+            f.write(b"".join(kept_keys))
+        self._disk_vectors = None  # a mapped file can't be replaced on Windows
+        self._disk_rows, self._disk_count = {}, 0  # stays empty if a step below fails
+        os.remove(self._keys_path)
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        os.replace(self._keys_path + ".tmp", self._keys_path)
+
+        self._disk_rows = {key: i for i, key in enumerate(kept_keys)}
+        self._disk_count = len(kept_keys)
+        print(f"🗂️ Compacted embedding cache to {self._disk_count} vectors")
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache()
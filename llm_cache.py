@@ -0,0 +1,104 @@
+# llm_cache.py
+# Content-addressed cache of LLM completions, for record/replay runs.
+#
+# A completion is keyed by a hash of everything that determines it: the unified prompt,
+# temperature, max_tokens, seed, model path and the decoding schema. Records are appended to one
+# binary file as <16-byte key><uint32 length><utf-8 reply>; on load, later records win and a
+# partially written tail is dropped.
+#
+# Modes (LLM_CACHE_MODE):
+#   off    - no caching
+#   record - always generate, append every completion
+#   replay - serve recorded completions; misses are generated and recorded
+
+import os
+import json
+import struct
+import hashlib
+import threading
+
+from config import LLM_CACHE_MODE, LLM_CACHE_PATH
+
+KEY_BYTES = 16
+_LENGTH = struct.Struct("<I")
+MODES = ("off", "record", "replay")
+
+
+class LLMResponseCache:
+    def __init__(self, path=LLM_CACHE_PATH, mode=LLM_CACHE_MODE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode '{mode}', expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._responses: dict[bytes, str] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        if mode != "off":
+            self._load()
+
+    @staticmethod
+    def key(prompt: str, temperature: float, max_tokens: int, seed, model_path: str, schema=None) -> bytes:
+        payload = json.dumps(
+            [prompt, float(temperature), int(max_tokens), seed, model_path, schema],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+    def get(self, key: bytes) -> str | None:
+        """Return the recorded reply in replay mode, or None if it must be generated."""
+        if self.mode != "replay":
+            return None
+        with self._lock:
+            reply = self._responses.get(key)
+            if reply is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return reply
+
+    def put(self, key: bytes, reply: str) -> None:
+        if self.mode == "off":
+            return
+        data = reply.encode("utf-8")
+        with self._lock:
+            self._responses[key] = reply
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(key + _LENGTH.pack(len(data)) + data)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        pos = 0
+        header = KEY_BYTES + _LENGTH.size
+        while pos + header <= len(data):
+            key = data[pos:pos + KEY_BYTES]
+            (length,) = _LENGTH.unpack_from(data, pos + KEY_BYTES)
+            end = pos + header + length
+            if end > len(data):
+                break
+            self._responses[key] = data[pos + header:end].decode("utf-8")
+            pos = end
+
+        if pos < len(data):
+            # Drop a partially written record so new appends stay aligned
+            with open(self.path, "r+b") as f:
+                f.truncate(pos)
+        print(f"📼 Loaded {len(self._responses)} recorded LLM responses ({self.mode} mode)")
+
+
+llm_cache = LLMResponseCache()
@@ -2,12 +2,40 @@ import os
 import time
 import random
 from datetime import datetime
-from config import TESTING, HOURS, TWEETS
+import numpy as np
+from config import TESTING, HOURS, TWEETS, RANDOM_SEED
 from perception import perception_phase
-from reflection import reflection_phase
+from reflection import reflection_phase, plan_reflection
 from tweet_phase import tweet_phase
+from pipeline import background_writes
+from llm_cache import llm_cache
+from telemetry import telemetry, traced
+
+@traced("cycle")
+def run_cycle():
+    # Execute the tweet generation pipeline. The LLM calls run in order on this thread;
+    # memory insertion and log writes of each call run on the background writer, and when
+    # reflection will run its subreddit suggestion search runs alongside the perception call.
+    plan_reflection()
+
+    print("==== PERCEPTION PHASE =====")
+    perception_response = perception_phase()
+    print(f"🧠 Perception response: {perception_response}\n\n")
+    
+    print("==== REFLECTION PHASE =====")
+    reflection_response = reflection_phase()
+    if reflection_response:
+        print(f"🤔 Reflection response: {reflection_response}\n\n")
+    
+    print("==== TWEET PHASE =====")
+    tweet = tweet_phase()
+    print(f"🐦 Generated tweet: {tweet}\n\n")
 
 def main():
+    if RANDOM_SEED is not None:
+        random.seed(RANDOM_SEED)
+        np.random.seed(RANDOM_SEED)
+    
     # Compute total window in seconds
     total_window = HOURS * 3600
     
@@ -35,20 +63,12 @@ def main():
         else:
             print("⏩ (testing mode — skipping sleep)\n")
         
-        # Execute the tweet generation pipeline
-        print("==== PERCEPTION PHASE =====")
-        perception_response = perception_phase()
-        print(f"🧠 Perception response: {perception_response}\n\n")
-        
-        print("==== REFLECTION PHASE =====")
-        reflection_response = reflection_phase()
-        if reflection_response:
-            print(f"🤔 Reflection response: {reflection_response}\n\n")
-        
-        print("==== TWEET PHASE =====")
-        tweet = tweet_phase()
-        print(f"🐦 Generated tweet: {tweet}\n\n")
+        run_cycle()
+        telemetry.write_metrics_snapshot()
     
+    background_writes.drain()
+    llm_cache.close()
+    telemetry.write_metrics_snapshot()
     print("\n✅ All scheduled tweets have been generated.")
 
 if __name__ == "__main__":
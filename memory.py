@@ -4,9 +4,74 @@
 import faiss
 import numpy as np
 import os
-import json
+import time
+import atexit
+import threading
+from collections.abc import Sequence
 from datetime import datetime
-from config import MEMORY_DB_PATH
+from config import (
+    MEMORY_DB_PATH,
+    MEMORY_VECTOR_DTYPE,
+    MEMORY_WAL_FSYNC_EVERY,
+    MEMORY_WAL_FSYNC_INTERVAL,
+    MEMORY_SNAPSHOT_EVERY,
+    MEMORY_SNAPSHOT_INTERVAL,
+    MEMORY_CONSOLIDATE_THRESHOLD,
+    MEMORY_HOT_WINDOW,
+    MEMORY_ARCHIVE_BATCH,
+    MEMORY_COLD_PQ_M,
+)
+from memory_store import MemoryStore
+from memory_cold import ColdTier
+import memory_index
+from telemetry import span, traced, telemetry
+
+EXP_DECAY_RATE = 0.1  # per-memory-age rate for decay='exp'
+SIMILARITY_CHUNK_ROWS = 65536  # rows upcast at a time when vectors are stored as float16
+DIVERSITY_SCAN_ROWS = 4096  # newest-first window scanned per step of the strict diversity pass
+
+
+def normalize(vectors) -> np.ndarray:
+    """Return float32 copies of the given vector(s) scaled to unit L2 norm (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class MemoryTexts(Sequence):
+    """Text column parallel to the vector matrix.
+
+    Texts are read from the metadata log on access, so nothing is materialised on load.
+    """
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def __len__(self):
+        return self.store.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.store.text(j) for j in range(*i.indices(len(self)))]
+        return self.store.text(i)
+
+
+class MemoryEntries(Sequence):
+    """Read-only (text, vector) view over the memory store, vectors being zero-copy matrix rows."""
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def __len__(self):
+        return self.store.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return (self.store.text(i), self.store.vectors()[i])
+
 
 class MemoryDB:
     def __init__(self, dim=1536, db_path=MEMORY_DB_PATH):
@@ -14,57 +79,481 @@ class MemoryDB:
         self.db_path = db_path
         db_dir = os.path.dirname(self.db_path)
         os.makedirs(db_dir, exist_ok=True)
-        
-        self.jsonl_path = os.path.join(db_dir, "log.jsonl")
-        self.index: faiss.IndexFlatL2 | None = None
-        self.entries = []  # Store (text, vector) pairs
-        
-        if os.path.exists(self.db_path):
+
+        self.store = MemoryStore(db_dir, dtype=MEMORY_VECTOR_DTYPE,
+                                 fsync_every=MEMORY_WAL_FSYNC_EVERY, fsync_interval=MEMORY_WAL_FSYNC_INTERVAL)
+        self.jsonl_path = self.store.log_path
+        self.cold = ColdTier(db_dir, pq_m=MEMORY_COLD_PQ_M)  # PQ codes of memories older than the hot window
+        self._index: faiss.Index | None = None  # covers the hot rows [hot_start, count), ids = rows
+        self._index_lock = threading.RLock()  # guards the index (and hot_start) against a rebuild swap
+        self._index_builder: threading.Thread | None = None
+        self._index_swapped = False  # a rebuilt index not yet written to db_path
+        self.texts = MemoryTexts(self.store)
+        self.entries = MemoryEntries(self.store)  # (text, vector) view over stored memories
+        self._exp_decay = np.zeros(0, dtype=np.float32)  # exp(-rate * age) for age = 1, 2, ...
+        self._recency_cache: dict[str, tuple[tuple[int, int], np.ndarray]] = {}
+        self._last_snapshot = time.monotonic()
+
+        if self.store.exists():
             self.load()
+        elif os.path.exists(self.db_path):
+            self._migrate_legacy()
+        atexit.register(self.close)
+
+    @property
+    def index(self) -> faiss.Index | None:
+        """The FAISS index, read from disk on first use so startup stays cheap."""
+        if self._index is None and self.store.count:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._load_index()
+            self._maybe_rebuild_index()
+        return self._index
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Zero-copy (N, dim) view of the L2-normalised memory vectors, oldest first.
+
+        Rows below hot_start are archived: they stay on disk and search paths score them from
+        their PQ codes instead, so only the hot window is paged in.
+        """
+        return self.store.vectors()
 
+    @property
+    def hot_start(self) -> int:
+        """First memory row of the hot window (rows before it are in the cold tier)."""
+        return self.cold.count
+
+    def __len__(self):
+        return self.store.count
+
+    @traced("memory_add")
     def add(self, text, vector, response_type="unknown"):
+        """Store a memory, or merge it into an existing near-duplicate (see _merge)."""
         print(f"🧠 Adding to memory...")
-        
+
         timestamp = datetime.utcnow().isoformat()
         metadata = {
             "response_type": response_type,
             "response": text,
             "timestamp": timestamp
         }
-        
-        vec_np = np.array([vector]).astype("float32")
-        if self.index is None or self.index.d != vec_np.shape[1]:
-            self.index = faiss.IndexFlatL2(vec_np.shape[1])
-            
-        self.index.add(vec_np)
-        self.entries.append((text, vector))
-        self.save()
-        
-        # Log metadata to jsonl file
-        with open(self.jsonl_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(metadata) + "\n")
+
+        vec_np = normalize([vector])
+        if self.store.dim is not None and self.store.dim != vec_np.shape[1]:
+            raise ValueError(f"Vector has dim {vec_np.shape[1]}, memory DB expects {self.store.dim}")
+
+        self.index  # load before taking the lock, so a pending rebuild doesn't run under it
+        with self._index_lock:
+            if self._index is None:
+                self._index = memory_index.empty_index(vec_np.shape[1])
+
+            match = self._near_duplicate(vec_np)
+            if match is not None:
+                self._merge(match[0], match[1], metadata)
+                return
+
+            # The store commit (vector + metadata log line) comes first; a stale index is rebuilt on load
+            with span("memory_store_append"):
+                self.store.append(vec_np[0], metadata)
+            with span("faiss_add"):
+                memory_index.add_rows(self._index, vec_np, self.store.count - 1)
+        self._maybe_rebuild_index()
+
+        # Inserts only append to the write-ahead log; full snapshots follow the count/time policy
+        if (self.store.pending >= MEMORY_SNAPSHOT_EVERY
+                or time.monotonic() - self._last_snapshot >= MEMORY_SNAPSHOT_INTERVAL):
+            self.snapshot()
+
+    def _near_duplicate(self, vec_np):
+        """(row, similarity) of the nearest hot memory if it is above the consolidation threshold.
+
+        The index finds the candidate; its similarity is recomputed exactly from the stored vector,
+        since approximate indexes only estimate it.
+        """
+        if not MEMORY_CONSOLIDATE_THRESHOLD or self._index.ntotal == 0:
+            return None
+        with span("memory_dedup_search"):
+            _, I = self._index.search(vec_np, 1)
+        i = int(I[0][0])
+        if not 0 <= i < self.store.count:
+            return None
+        similarity = float(np.asarray(self.vectors[i], dtype=np.float32) @ vec_np[0])
+        return (i, similarity) if similarity >= MEMORY_CONSOLIDATE_THRESHOLD else None
+
+    def _merge(self, i, similarity, metadata):
+        """Fold a near-duplicate into memory i instead of storing a new vector.
+
+        Memory i keeps its text and vector; its new metadata record counts the hit, describes the
+        merged memory and links to the previous record, so provenance() can walk the whole chain.
+        The new record is the latest in the log, so recency_weights() and texts_seen_since()
+        treat memory i as seen now.
+        """
+        record = self.store.metadata(i)
+        record.update(
+            hits=record.get("hits", 1) + 1,
+            last_seen=metadata["timestamp"],
+            merged={**metadata, "similarity": round(similarity, 4)},
+            previous=self.store.offset(i),
+        )
+        with span("memory_merge", similarity=similarity):
+            self.store.update_metadata(i, record)
+        telemetry.inc("memory_merged")
+        print(f"🧠 Merged into existing memory #{i} (similarity {similarity:.3f}, {record['hits']} hits)")
+
+    @property
+    def log_position(self) -> int:
+        """Current end of the metadata log, a mark for texts_seen_since()."""
+        return self.store.log_size
+
+    def texts_seen_since(self, position, expected=()):
+        """Texts of the memories stored or merged into since log `position`, in the order seen.
+
+        `expected` texts, oldest first, were pending (queued for insertion) when `position` was
+        taken and have been accounted for already: the records they produced are skipped.
+        Returns (texts, the expected texts that have produced no record yet).
+        """
+        expected = list(expected)
+        seen: dict[int, str] = {}  # offset of each memory's latest record in the window -> text
+        for offset, record in self.store.records_since(position):
+            merged = record.get("merged") if "previous" in record else None
+            source = merged["response"] if merged else record["response"]
+            if source in expected:
+                del expected[:expected.index(source) + 1]
+                continue
+            if merged:
+                seen.pop(record["previous"], None)  # the memory moves to its latest sighting
+            seen[offset] = record["response"]
+        return list(seen.values()), expected
+
+    def hits(self, i):
+        """How many times memory i was stored, counting merged near-duplicates."""
+        return self.store.metadata(i).get("hits", 1)
+
+    def provenance(self, i):
+        """The memories merged into memory i, oldest first, as (response_type, response, timestamp) records."""
+        record = self.store.metadata(i)
+        merged = []
+        while "previous" in record:
+            merged.append(record["merged"])
+            record = self.store.record_at(record["previous"])
+        return [record] + merged[::-1]
+
+    def snapshot(self):
+        """Checkpoint the store and write the FAISS index, so a restart needs no WAL replay."""
+        with span("memory_snapshot", pending=self.store.pending):
+            self.store.checkpoint()
+            self.save()
+        self._last_snapshot = time.monotonic()
+
+    def close(self):
+        builder = self._index_builder
+        if builder is not None and builder.is_alive():
+            print("🧠 Waiting for the background memory index build to finish...")
+            builder.join()
+        if self.store.pending or self._index_swapped:
+            self.snapshot()
+        self.store.close()
+        atexit.unregister(self.close)
 
     def save(self):
         db_dir = os.path.dirname(self.db_path)
         os.makedirs(db_dir, exist_ok=True)
-        
-        if self.index is not None:
-            faiss.write_index(self.index, self.db_path)
+
+        with self._index_lock:
+            if self._index is not None:
+                with span("faiss_write_index", vectors=self._index.ntotal):
+                    faiss.write_index(self._index, self.db_path)
+                self._index_swapped = False
 
     def load(self):
-        self.index = faiss.read_index(self.db_path)
+        self.store.open()
+        self._index = None
+        print(f"🧠 Opened memory store with {self.store.count} memories")
 
+    def _load_index(self):
+        base = self.hot_start
+        hot = self.store.count - base
+        if os.path.exists(self.db_path):
+            index = memory_index.configure(faiss.read_index(self.db_path))
+            first = memory_index.first_row(index) if memory_index.has_row_ids(index) else None
+            if not memory_index.is_inner_product(index):
+                print("🧠 FAISS index uses L2 distance, rebuilding it for cosine similarity")
+            elif not memory_index.has_row_ids(index) or index.d != self.store.dim or first not in (base, None):
+                print("🧠 FAISS index doesn't match the hot memory window, rebuilding")
+            elif index.ntotal == hot:
+                return index
+            elif index.ntotal < hot:
+                # Memories recovered from the WAL after the last snapshot: add just the tail rows
+                tail = self.store.vectors()[base + index.ntotal:]
+                print(f"🧠 Adding {len(tail)} memories written since the last index snapshot")
+                memory_index.add_rows(index, tail, base + index.ntotal)
+                faiss.write_index(index, self.db_path)
+                return index
+            else:
+                print(f"⚠️ FAISS index has {index.ntotal} vectors but the hot window has {hot}, rebuilding")
+
+        # A flat rebuild is a plain copy; a larger index type is then built in the background
+        index = memory_index.build_index("flat", self.store.dim, self.store.vectors()[base:], base)
+        faiss.write_index(index, self.db_path)
+        return index
+
+    def _archive_target(self):
+        """Row up to which memories should move to the cold tier, or None if the hot window still fits."""
+        if not MEMORY_HOT_WINDOW:
+            return None
+        batch = max(MEMORY_ARCHIVE_BATCH, self.cold.min_archive_rows)
+        if self.store.count - self.hot_start < MEMORY_HOT_WINDOW + batch:
+            return None
+        return self.store.count - MEMORY_HOT_WINDOW
+
+    def _maybe_rebuild_index(self):
+        """Start a background rebuild if the hot window is full or has crossed into another index tier."""
+        if self._index is None or (self._index_builder is not None and self._index_builder.is_alive()):
+            return
+        archive_to = self._archive_target()
+        kind = memory_index.index_kind_for(self.store.count - (archive_to or self.hot_start))
+        if archive_to is None and kind == memory_index.kind_of(self._index):
+            return
+        self._index_builder = threading.Thread(
+            target=self._rebuild_index, args=(kind, archive_to), name="memory-index-builder", daemon=True)
+        self._index_builder.start()
+
+    def _rebuild_index(self, kind, archive_to=None):
+        """Build a `kind` index over the hot rows stored so far, then catch up on newer rows and swap it in.
+
+        With `archive_to`, rows up to it are first PQ-encoded into the cold tier, which takes them
+        over in the same swap. add() and search() keep using the current index during the build
+        (FAISS releases the GIL); the lock is only held for the catch-up and swap. The new index is
+        written at the next snapshot.
+        """
+        count = self.store.count
+        base = self.hot_start
+        try:
+            if archive_to is not None:
+                print(f"🧊 Archiving {archive_to - base} memories to the cold tier in the background...")
+                with span("memory_archive", vectors=archive_to - base):
+                    self.cold.archive(self.store.vectors()[base:archive_to])
+                base = archive_to
+            print(f"🧠 Building {kind} memory index over {count - base} memories in the background...")
+            with span("memory_index_build", kind=kind, vectors=count - base):
+                index = memory_index.build_index(kind, self.store.dim, self.store.vectors()[base:count], base)
+        except Exception as e:
+            print(f"❌ Error building {kind} memory index: {e}")
+            return
+
+        with self._index_lock:
+            if self.store.count > count:
+                memory_index.add_rows(index, self.store.vectors()[count:], count)
+            if archive_to is not None:
+                self.cold.commit(archive_to)
+            self._index = index
+            self._index_swapped = True
+        print(f"🧠 Switched memory index to {kind} ({index.ntotal} hot, {self.hot_start} cold memories)")
+
+    def _migrate_legacy(self):
+        """Convert a pre-store database (index.faiss + log.jsonl only) without re-embedding.
+
+        Vectors are reconstructed from the flat index and paired with log lines in order.
+        """
+        index = faiss.read_index(self.db_path)
+        log_lines = []
+        if os.path.exists(self.jsonl_path):
+            with open(self.jsonl_path, "rb") as f:
+                log_lines = [line if line.endswith(b"\n") else line + b"\n" for line in f if line.strip()]
+
+        count = min(index.ntotal, len(log_lines))
+        if count < index.ntotal:
+            print(f"⚠️ Only {len(log_lines)} log lines for {index.ntotal} indexed vectors, keeping {count}")
+        vectors = normalize(index.reconstruct_n(0, count)) if count else np.zeros((0, index.d), dtype=np.float32)
+
+        self.store.dim = index.d
+        self.store.create_from(vectors, log_lines)
+        self._index = None
+        print(f"🧠 Migrated legacy memory DB to versioned store ({count} memories)")
+
+    def similarities(self, vector, extra=None) -> np.ndarray:
+        """Cosine similarity of every stored memory to `vector`, followed by each row of `extra`.
+
+        Exact (one matrix-vector product) for the hot window; estimated from PQ codes for
+        archived memories. `extra` holds normalised vectors of memories not stored yet.
+        """
+        query = normalize(vector)
+        if extra is not None and len(extra):
+            return np.concatenate([self.similarities(query), extra @ query])
+        vectors = self.vectors
+        if not len(vectors):
+            return np.zeros(0, dtype=np.float32)
+        # Read before the codes: ColdTier.commit publishes codes first, so they cover hot_start rows
+        hot_start = min(self.hot_start, len(vectors))
+        sims = np.empty(len(vectors), dtype=np.float32)
+        if hot_start:
+            sims[:hot_start] = self.cold.similarities(query)[:hot_start]
+
+        hot = vectors[hot_start:]
+        if hot.dtype == np.float32:
+            sims[hot_start:] = hot @ query
+            return sims
+        for start in range(0, len(hot), SIMILARITY_CHUNK_ROWS):
+            chunk = hot[start:start + SIMILARITY_CHUNK_ROWS]
+            sims[hot_start + start:hot_start + start + len(chunk)] = chunk.astype(np.float32) @ query
+        return sims
+
+    def recency_weights(self, decay="linear", total=None) -> np.ndarray:
+        """Per-memory recency weights, oldest first, cached until a memory is stored or merged into.
+
+        A memory last seen at row p (its own index, or later if a near-duplicate was merged into
+        it; see MemoryStore.last_seen_rows) has age = N - p. Linear decay weights it age / N,
+        exponential decay exp(-EXP_DECAY_RATE * age). `total` overrides N (stored plus pending
+        memories, the pending ones being the newest rows).
+        """
+        total = len(self) if total is None else total
+        key = (total, self.store.log_size)
+        cached = self._recency_cache.get(decay)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        seen = self.store.last_seen_rows()
+        if total > len(seen):
+            seen = np.concatenate([seen, np.arange(len(seen), total)])
+        ages = total - seen  # 1 .. total
+        if decay == "exp":
+            if len(self._exp_decay) < total:
+                exp_ages = np.arange(1, max(total, 2 * len(self._exp_decay)) + 1, dtype=np.float32)
+                self._exp_decay = np.exp(-EXP_DECAY_RATE * exp_ages)
+            weights = self._exp_decay[ages - 1]
+        else:
+            weights = ages.astype(np.float32) / np.float32(max(total, 1))
+
+        self._recency_cache[decay] = (key, weights)
+        return weights
+
+    def _pending_matrix(self, pending):
+        """Normalised (P, dim) vectors of (text, vector) pairs not stored yet, or None."""
+        return normalize([vector for _, vector in pending]) if pending else None
+
+    def _text(self, i, pending):
+        """Text of row i, counting the pending (text, vector) pairs as rows after the stored ones."""
+        count = self.store.count
+        return self.store.text(i) if i < count else pending[i - count][0]
+
+    def _rows(self, lo, hi, extra):
+        """float32 vectors of rows [lo, hi), where rows from the memory count on are `extra` rows."""
+        count = self.store.count
+        parts = []
+        if lo < count:
+            parts.append(np.asarray(self.vectors[lo:min(hi, count)], dtype=np.float32))
+        if hi > count:
+            parts.append(extra[max(lo - count, 0):hi - count])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    @traced("memory_recency_search")
+    def recency_weighted_search(self, vector, k=5, a=0.9, b=0.6, decay="linear", pending=()):
+        """Return up to k (text, score) pairs, best first, scored a * sim01 + b * recency.
+
+        sim01 maps cosine similarity from -1..1 onto 0..1; see recency_weights for the decay.
+        Archived memories compete on their PQ-estimated similarity. `pending` (text, vector)
+        pairs, oldest first, are memories queued for insertion and rank as the newest ones.
+        """
+        total = len(self) + len(pending)
+        if total == 0 or k <= 0:
+            return []
+
+        sims = self.similarities(vector, self._pending_matrix(pending))
+        scores = a * 0.5 * (1.0 + sims) + b * self.recency_weights(decay, total)
+        k = min(k, total)
+        top = np.argpartition(-scores, k - 1)[:k] if k < total else np.arange(total)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._text(int(i), pending), float(scores[i])) for i in top]
+
+    @traced("memory_diverse_search")
+    def diverse_recent_search(self, n=5, threshold=0.9, pending=()):
+        """Pick up to n recent, mutually dissimilar memories (Maximal Marginal Relevance style).
+
+        Strict pass: walking newest to oldest, take a memory only if its cosine similarity to
+        every memory taken so far is below `threshold`. Picks happen in scan order, so the next
+        pick is simply the first newer-than-oldest-pick row whose running max-similarity is
+        below the threshold; the scan proceeds in windows over the hot window and stops as soon
+        as n are found.
+
+        Relaxed pass (only when fewer than n were found and at least n exist): repeatedly take
+        the memory whose max-similarity to the selection is lowest (newest wins ties), keeping
+        a running max-similarity vector that is updated with one matrix-vector product per pick.
+
+        `pending` (text, vector) pairs, oldest first, are memories queued for insertion; they
+        count as the newest rows.
+
+        Returns texts in selection order (most recent strict picks first).
+        """
+        total = len(self) + len(pending)
+        if total == 0 or n <= 0:
+            return []
+
+        extra = self._pending_matrix(pending)
+        hot_start = self.hot_start
+        selected: list[int] = []
+        start = total - 1  # newest row not yet scanned
+
+        while len(selected) < n and start >= hot_start:
+            stop = max(start - DIVERSITY_SCAN_ROWS, hot_start - 1)
+            window = self._rows(stop + 1, start + 1, extra)[::-1]  # newest first
+            if selected:
+                picked = np.concatenate([self._rows(i, i + 1, extra) for i in selected])
+                max_sim = (window @ picked.T).max(axis=1)
+                ok = np.flatnonzero(max_sim < threshold)
+            else:
+                ok = np.zeros(1, dtype=np.int64)
+
+            if ok.size == 0:
+                start = stop
+                continue
+            idx = start - int(ok[0])
+            selected.append(idx)
+            start = idx - 1
+
+        if len(selected) < n and total >= n:
+            print(f"🧠 Only found {len(selected)} diverse memories with threshold {threshold}, relaxing criteria...")
+            max_sim = np.full(total, -1.0, dtype=np.float32)  # cosine floor, so the first pick is finite
+            for idx in selected:
+                np.maximum(max_sim, self.similarities(self._rows(idx, idx + 1, extra)[0], extra), out=max_sim)
+            max_sim[selected] = np.inf
+
+            while len(selected) < n:
+                newest_first = max_sim[::-1]
+                pos = int(np.argmin(newest_first))
+                if not np.isfinite(newest_first[pos]):
+                    break
+                idx = total - 1 - pos
+                selected.append(idx)
+                np.maximum(max_sim, self.similarities(self._rows(idx, idx + 1, extra)[0], extra), out=max_sim)
+                max_sim[idx] = np.inf
+
+        return [self._text(idx, pending) for idx in selected]
+
+    @traced("memory_search")
     def search(self, vector, k=5):
-        if self.index is None:
+        """Return up to k (text, cosine similarity) pairs, most similar first.
+
+        The FAISS index covers the hot window; archived memories are scored from their PQ codes
+        and merged in by score.
+        """
+        if self.index is None or k <= 0:
             return []
-            
-        D, I = self.index.search(np.array([vector]).astype("float32"), k)
-        
-        return [
-            (self.entries[i][0], float(D[0][j]))
-            for j, i in enumerate(I[0])
-            if i < len(self.entries)
-        ]
+
+        query = normalize([vector])
+        with self._index_lock:
+            D, I = self._index.search(query, k)
+            hot_start = self.hot_start
+        hits = [(int(i), float(d)) for d, i in zip(D[0], I[0]) if 0 <= i < self.store.count]
+
+        if hot_start:
+            with span("memory_cold_search", vectors=hot_start):
+                sims = self.cold.similarities(query[0])[:hot_start]
+            top = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+            hits += [(int(i), float(sims[i])) for i in top]
+            hits.sort(key=lambda hit: -hit[1])
+
+        return [(self.store.text(i), score) for i, score in hits[:k]]
 
 # Singleton instance
-memory_db = MemoryDB() 
\ No newline at end of file
+memory_db = MemoryDB()
\ No newline at end of file
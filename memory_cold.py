@@ -0,0 +1,188 @@
+# memory_cold.py
+# Compressed archival tier for old memories.
+#
+# MemoryDB keeps a recent window of memories hot (full-precision vectors in the FAISS index and
+# numpy scoring paths). Memories older than the window are archived here as product-quantised
+# codes, a few dozen bytes per memory instead of dim * 4; their texts stay in the store's metadata
+# log. Cold memories are scored on demand by asymmetric distance computation: the query is
+# compared to every PQ centroid once, then each memory's score is a sum of table lookups.
+#
+# Rows [0, count) of the store are cold. Files in the memory DB directory:
+#   cold.pq     - the trained faiss ProductQuantizer
+#   cold.codes  - uint8 codes, one code_size row per archived memory;
+#                 cold.<generation>.codes after the first archive batch
+#   cold.json   - number of archived rows and codes generation (commit point, written last)
+#
+# The codes file is mapped for search, and a background archive batch may run while a reader
+# still scores an old mapping, so a mapped file is never resized (Windows refuses). Each archive
+# batch writes the committed codes plus the new ones to the next generation's file; commit()
+# switches to it, and files of older generations are deleted once nothing maps them.
+
+import os
+import re
+import json
+
+import faiss
+import numpy as np
+
+from memory_index import pq_subquantizers
+
+PQ_FILENAME = "cold.pq"
+CODES_FILENAME = "cold.codes"
+META_FILENAME = "cold.json"
+_CODES_GENERATION_FILENAME = re.compile(r"cold\.(\d+)\.codes")
+
+PQ_BITS = 8  # 256 centroids per sub-quantizer, one byte per sub-vector
+PQ_TRAINING_ROWS = 65536
+ENCODE_CHUNK_ROWS = 65536
+SCORE_CHUNK_ROWS = 262144
+
+
+class ColdTier:
+    def __init__(self, db_dir, pq_m=16):
+        self.db_dir = db_dir
+        self.pq_path = os.path.join(db_dir, PQ_FILENAME)
+        self.generation = 0
+        self.codes_path = self._codes_path(0)
+        self.meta_path = os.path.join(db_dir, META_FILENAME)
+        self.pq_m = pq_m
+
+        self.count = 0
+        self.pq: faiss.ProductQuantizer | None = None
+        self._centroids: np.ndarray | None = None  # (M, ksub, dsub)
+        self._codes: np.ndarray | None = None  # (count, code_size) memmap
+        self._stale_codes_paths: list[str] = []  # older generations, deleted once unmapped
+        self.open()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def min_archive_rows(self):
+        """Rows needed for an archive batch: the first one trains the quantizer (one point per centroid)."""
+        return 1 << PQ_BITS if self.pq is None else 1
+
+    def _codes_path(self, generation):
+        name = CODES_FILENAME if generation == 0 else f"cold.{generation}.codes"
+        return os.path.join(self.db_dir, name)
+
+    def open(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        self.generation = meta.get("generation", 0)
+        self.codes_path = self._codes_path(self.generation)
+        self._set_pq(faiss.read_ProductQuantizer(self.pq_path))
+
+        committed = self.count * self.pq.code_size
+        size = os.path.getsize(self.codes_path) if os.path.exists(self.codes_path) else 0
+        if size < committed:
+            raise ValueError(f"Cold memory codes file {self.codes_path} is shorter than committed ({size} < {committed} bytes)")
+        self._remap()
+        self._remove_other_codes_files()
+
+    def _remove_other_codes_files(self):
+        """Delete codes files of generations other than the committed one (an uncommitted archive, or still mapped)."""
+        for name in os.listdir(self.db_dir):
+            match = _CODES_GENERATION_FILENAME.fullmatch(name)
+            generation = int(match.group(1)) if match else (0 if name == CODES_FILENAME else None)
+            if generation is not None and generation != self.generation:
+                self._stale_codes_paths.append(os.path.join(self.db_dir, name))
+        self._remove_stale_codes_files()
+
+    def _remove_stale_codes_files(self):
+        remaining = []
+        for path in self._stale_codes_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                remaining.append(path)  # a reader still maps it (Windows); retried at the next commit
+        self._stale_codes_paths = remaining
+
+    def _set_pq(self, pq):
+        self.pq = pq
+        self._centroids = faiss.vector_to_array(pq.centroids).reshape(pq.M, pq.ksub, pq.dsub)
+
+    def _remap(self):
+        self._codes = self._map(self.count)
+
+    def _map(self, count):
+        if not count:
+            return None
+        return np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(count, self.pq.code_size))
+
+    # ----------------------------------------------------------------------------------
+    # Archiving
+    # ----------------------------------------------------------------------------------
+
+    def archive(self, vectors):
+        """Encode and write codes for the store rows following the archived ones (synced).
+
+        The codes go to the next generation's file, after a copy of the committed ones, so the
+        mapped file is never resized. The quantizer is trained on the first batch ever archived.
+        Returns the new archived row count, which takes effect once passed to commit().
+        """
+        if self.pq is None:
+            self._train(vectors)
+        # An uncommitted archive left this file behind; "wb" discards it
+        with open(self._codes_path(self.generation + 1), "wb") as f:
+            if self._codes is not None:
+                for start in range(0, len(self._codes), SCORE_CHUNK_ROWS):
+                    f.write(self._codes[start:start + SCORE_CHUNK_ROWS].tobytes())
+            for start in range(0, len(vectors), ENCODE_CHUNK_ROWS):
+                chunk = np.ascontiguousarray(vectors[start:start + ENCODE_CHUNK_ROWS], dtype=np.float32)
+                f.write(self.pq.compute_codes(chunk).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return self.count + len(vectors)
+
+    def _train(self, vectors):
+        dim = vectors.shape[1]
+        pq = faiss.ProductQuantizer(dim, pq_subquantizers(dim, self.pq_m), PQ_BITS)
+        rows = np.arange(len(vectors))
+        if len(vectors) > PQ_TRAINING_ROWS:
+            rows = np.sort(np.random.default_rng(0).choice(len(vectors), size=PQ_TRAINING_ROWS, replace=False))
+        pq.train(np.ascontiguousarray(vectors[rows], dtype=np.float32))
+        faiss.write_ProductQuantizer(pq, self.pq_path)
+        self._set_pq(pq)
+
+    def commit(self, count):
+        """Make rows [0, count) cold, switching to the codes file written by archive().
+
+        The new codes are published before the count, so a reader that sees the new count (as
+        MemoryDB.hot_start) always finds codes for every cold row, without taking a lock.
+        """
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"count": count, "code_size": self.pq.code_size, "generation": self.generation + 1}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+        self._stale_codes_paths.append(self.codes_path)
+        self.generation += 1
+        self.codes_path = self._codes_path(self.generation)
+        self._codes = self._map(count)
+        self.count = count
+        self._remove_stale_codes_files()
+
+    # ----------------------------------------------------------------------------------
+    # Search
+    # ----------------------------------------------------------------------------------
+
+    def similarities(self, query) -> np.ndarray:
+        """Approximate inner product of every archived memory with the (normalised) query."""
+        codes = self._codes
+        if codes is None:
+            return np.zeros(0, dtype=np.float32)
+
+        table = np.einsum("mkd,md->mk", self._centroids, np.asarray(query, dtype=np.float32).reshape(self.pq.M, -1))
+        subquantizers = np.arange(self.pq.M)
+        sims = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start:start + SCORE_CHUNK_ROWS]
+            sims[start:start + len(chunk)] = table[subquantizers, chunk].sum(axis=1)
+        return sims
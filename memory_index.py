@@ -0,0 +1,123 @@
+# memory_index.py
+# FAISS index types for MemoryDB, chosen by memory count.
+#
+# Memory vectors are L2-normalised, so every index uses inner product (= cosine similarity), like
+# the numpy retrieval paths. Small databases use an exact flat index; past the tier thresholds in
+# MEMORY_INDEX_TIERS the index becomes an HNSW graph and then IVF-PQ (compressed codes), keeping
+# search latency bounded as memories accumulate. Building a new index (including training) is
+# done by MemoryDB on a background thread.
+#
+# Indexes are wrapped in an IndexIDMap whose ids are store row numbers, so an index can cover only
+# the hot window of memories (rows [first_row, count), see memory_cold.py). Tiers are chosen by the
+# hot count, so with hot/cold tiering on only those below the hot window's size are ever reached.
+
+import math
+
+import faiss
+import numpy as np
+
+from config import (
+    MEMORY_INDEX_TIERS,
+    MEMORY_INDEX_HNSW_M,
+    MEMORY_INDEX_EF_SEARCH,
+    MEMORY_INDEX_PQ_M,
+    MEMORY_INDEX_NPROBE,
+)
+
+INDEX_KINDS = ("flat", "hnsw", "ivfpq")
+ADD_CHUNK_ROWS = 65536
+IVF_TRAINING_POINTS_PER_LIST = 64
+
+
+def index_kind_for(count) -> str:
+    """The index kind for a database of `count` memories (the last tier whose threshold is reached)."""
+    kind = "flat"
+    for threshold, tier_kind in sorted(MEMORY_INDEX_TIERS):
+        if count >= threshold:
+            kind = tier_kind
+    return kind
+
+
+def _inner(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def kind_of(index) -> str:
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def has_row_ids(index) -> bool:
+    return isinstance(index, faiss.IndexIDMap)
+
+
+def first_row(index):
+    """Store row of the first vector in an index with row ids (None when empty)."""
+    if index.ntotal == 0:
+        return None
+    return int(faiss.rev_swig_ptr(index.id_map.data(), 1)[0])
+
+
+def is_inner_product(index) -> bool:
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def configure(index):
+    """Apply the search-time parameters (not stored in index files)."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = MEMORY_INDEX_EF_SEARCH
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = MEMORY_INDEX_NPROBE
+    return index
+
+
+def _with_row_ids(inner):
+    index = faiss.IndexIDMap(inner)
+    index.own_fields = True
+    inner.this.disown()
+    return index
+
+
+def empty_index(dim):
+    return _with_row_ids(faiss.IndexFlatIP(dim))
+
+
+def add_rows(index, vectors, first):
+    """Add vectors as store rows first, first + 1, ..."""
+    ids = np.arange(first, first + len(vectors), dtype=np.int64)
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+
+
+def pq_subquantizers(dim, max_m=MEMORY_INDEX_PQ_M):
+    """The largest divisor of dim not above max_m (PQ needs dim % m == 0)."""
+    return max(m for m in range(1, min(max_m, dim) + 1) if dim % m == 0)
+
+
+def build_index(kind, dim, vectors, first=0):
+    """Build (and train, for IVF-PQ) an inner-product index of `kind` over `vectors`, rows first, first + 1, ..."""
+    count = len(vectors)
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, MEMORY_INDEX_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "ivfpq":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // IVF_TRAINING_POINTS_PER_LIST))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), 8, faiss.METRIC_INNER_PRODUCT)
+        index.own_fields = True
+        quantizer.this.disown()
+        sample_size = min(count, max(nlist * IVF_TRAINING_POINTS_PER_LIST, 256 * 39))
+        sample = np.random.default_rng(0).choice(count, size=sample_size, replace=False)
+        index.train(np.ascontiguousarray(vectors[np.sort(sample)], dtype=np.float32))
+    else:
+        raise ValueError(f"Unknown memory index kind {kind!r}, expected one of {INDEX_KINDS}")
+
+    index = _with_row_ids(index)
+    for start in range(0, count, ADD_CHUNK_ROWS):
+        add_rows(index, vectors[start:start + ADD_CHUNK_ROWS], first + start)
+    return configure(index)
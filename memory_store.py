@@ -0,0 +1,534 @@
+# memory_store.py
+# Versioned on-disk layout backing MemoryDB.
+#
+# A memory database directory holds:
+#   manifest.json  - format version, vector dim/dtype, committed memory count and log size
+#   vectors.bin    - preallocated row-major vector matrix (float32 or float16), memory-mapped;
+#                    vectors.<generation>.bin once it has grown (see _reserve)
+#   log.offsets    - int64 byte offset of each memory's record inside log.jsonl
+#   log.jsonl      - the metadata log (response_type, response, timestamp), one JSON line per record;
+#                    a memory whose metadata was updated points at its newest line, older versions stay
+#   wal.bin        - write-ahead log of memories appended since the last checkpoint
+#   index.faiss    - the FAISS index over the same rows (owned by MemoryDB)
+#
+# The manifest is always written last (temp file + rename), so it is the commit point:
+# anything past the counts it records is the tail of an interrupted write and is ignored
+# (vector rows) or truncated (offsets, log) on open.
+#
+# A memory-mapped file can't be resized while views of it are alive (Windows refuses), and views
+# handed out by vectors() may be held by a background index build. So the vector file is never
+# resized in place: when it is full, the rows are copied into the next generation's larger file
+# and the store remaps to it. The manifest names the generation, and files of older generations
+# are deleted once a checkpoint has committed the new one (or on a later open, if still mapped).
+#
+# Appends are group-committed: each memory is written to the WAL as one record
+# (<uint32 payload length><uint64 memory index><uint32 crc32><vector bytes><log line>) and
+# applied to the vector/log files without syncing; the WAL is fsynced every `fsync_every` records,
+# or by a timer at most `fsync_interval` seconds after the first unsynced one. Metadata updates of
+# existing memories are WAL records flagged with _WAL_UPDATE whose payload is just the new log
+# line. `checkpoint()` syncs the data files, appends the new offsets (rewriting updated ones in
+# place), commits the manifest and empties the WAL. On open, WAL records past the manifest count
+# are replayed, so a crash loses at most the last unsynced group.
+
+import os
+import re
+import json
+import time
+import zlib
+import struct
+import threading
+import numpy as np
+
+STORE_VERSION = 2
+MANIFEST_FILENAME = "manifest.json"
+VECTORS_FILENAME = "vectors.bin"
+LEGACY_VECTORS_FILENAME = "vectors.f32"  # version 1 name, float32 only
+_VECTORS_GENERATION_FILENAME = re.compile(r"vectors\.(\d+)\.bin")
+COPY_CHUNK_BYTES = 64 << 20
+OFFSETS_FILENAME = "log.offsets"
+LOG_FILENAME = "log.jsonl"
+WAL_FILENAME = "wal.bin"
+_WAL_HEADER = struct.Struct("<IQI")  # payload length, memory index, crc32 of payload
+_WAL_UPDATE = 1 << 63  # set in the memory index field of a metadata update record
+
+SUPPORTED_DTYPES = ("float32", "float16")
+INITIAL_CAPACITY = 1024
+
+
+class MemoryStore:
+    def __init__(self, db_dir, dtype="float32", fsync_every=1, fsync_interval=0.0):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {SUPPORTED_DTYPES}")
+
+        self.db_dir = db_dir
+        self.manifest_path = os.path.join(db_dir, MANIFEST_FILENAME)
+        self.vectors_generation = 0
+        self.vectors_path = self._vectors_path(0)
+        self.offsets_path = os.path.join(db_dir, OFFSETS_FILENAME)
+        self.log_path = os.path.join(db_dir, LOG_FILENAME)
+        self.wal_path = os.path.join(db_dir, WAL_FILENAME)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self.dim: int | None = None
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.capacity = 0
+        self.log_size = 0
+        self._offsets = np.zeros(0, dtype=np.int64)  # grows by doubling, first `count` entries valid
+        self._matrix: np.ndarray | None = None  # (capacity, dim) memmap over vectors.bin
+        self._reader = None
+        self._lock = threading.Lock()
+
+        # Committed (manifest) state; rows in [committed_count, count) live in the WAL
+        self.committed_count = 0
+        self._updated_rows: set[int] = set()  # committed rows whose offsets changed since the checkpoint
+        self._wal = None
+        self._log_writer = None
+        self._vector_writer = None
+        self._stale_vector_paths: list[str] = []  # older generations, deleted after the next checkpoint
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._sync_timer: threading.Timer | None = None  # pending fsync of a partial WAL group
+
+    def _vectors_path(self, generation):
+        name = VECTORS_FILENAME if generation == 0 else f"vectors.{generation}.bin"
+        return os.path.join(self.db_dir, name)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    @property
+    def row_bytes(self):
+        return (self.dim or 0) * self.dtype.itemsize
+
+    @property
+    def pending(self):
+        """Memories appended since the last checkpoint."""
+        return self.count - self.committed_count
+
+    # ----------------------------------------------------------------------------------
+    # Open / commit
+    # ----------------------------------------------------------------------------------
+
+    def open(self):
+        """Open an existing store. Only the manifest and offset table are read eagerly."""
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        version = manifest.get("version")
+        if version not in (1, STORE_VERSION):
+            raise ValueError(f"Unsupported memory store version {version} (expected {STORE_VERSION})")
+        self.vectors_generation = manifest.get("vectors_generation", 0)
+        self.vectors_path = self._vectors_path(self.vectors_generation)
+        if version == 1:
+            legacy_path = os.path.join(self.db_dir, LEGACY_VECTORS_FILENAME)
+            if os.path.exists(legacy_path):
+                os.replace(legacy_path, self.vectors_path)
+
+        self.dim = manifest["dim"]
+        self.dtype = np.dtype(manifest.get("dtype", "float32"))
+        self.count = manifest["count"]
+        self.log_size = manifest["log_size"]
+
+        self._truncate_uncommitted()
+        self._remove_other_vector_files()
+        offsets = np.fromfile(self.offsets_path, dtype=np.int64, count=self.count) \
+            if self.count else np.zeros(0, dtype=np.int64)
+        if len(offsets) != self.count:
+            raise ValueError(f"Memory store offset table is shorter than the manifest count ({self.count})")
+        self._offsets = np.zeros(max(self.count, INITIAL_CAPACITY), dtype=np.int64)
+        self._offsets[:self.count] = offsets
+
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        self.capacity = vectors_size // self.row_bytes if self.row_bytes else 0
+        self._remap()
+        self.committed_count = self.count
+        if version != STORE_VERSION:
+            self._write_manifest()
+
+        replayed = self._replay_wal()
+        if replayed:
+            print(f"🧠 Recovered {replayed} memory records from the write-ahead log")
+            self.checkpoint()
+
+    def _truncate_uncommitted(self):
+        """Drop log and offset bytes written after the last manifest commit (e.g. a crash mid-append).
+
+        Vector rows past `count` are preallocated space and are simply overwritten later.
+        """
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if vectors_size < self.count * self.row_bytes:
+            raise ValueError(f"Memory store file {self.vectors_path} holds fewer than {self.count} rows")
+
+        expected = {
+            self.offsets_path: self.count * 8,
+            self.log_path: self.log_size,
+        }
+        for path, size in expected.items():
+            actual = os.path.getsize(path) if os.path.exists(path) else 0
+            if actual < size:
+                raise ValueError(f"Memory store file {path} is shorter than committed ({actual} < {size} bytes)")
+            if actual > size:
+                print(f"⚠️ Truncating {actual - size} uncommitted bytes from {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _write_manifest(self):
+        manifest = {
+            "version": STORE_VERSION,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "count": self.count,
+            "log_size": self.log_size,
+            "vectors_generation": self.vectors_generation,
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _remap(self):
+        if self.capacity and self.dim:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(self.capacity, self.dim))
+        else:
+            self._matrix = None
+
+    def _remove_other_vector_files(self):
+        """Delete vector files of generations other than the committed one (left by a crash or a live mapping)."""
+        for name in os.listdir(self.db_dir):
+            match = _VECTORS_GENERATION_FILENAME.fullmatch(name)
+            generation = int(match.group(1)) if match else (0 if name == VECTORS_FILENAME else None)
+            if generation is not None and generation != self.vectors_generation:
+                self._stale_vector_paths.append(os.path.join(self.db_dir, name))
+        self._remove_stale_vector_files()
+
+    def _remove_stale_vector_files(self):
+        remaining = []
+        for path in self._stale_vector_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                remaining.append(path)  # still mapped by a reader (Windows); retried later
+        self._stale_vector_paths = remaining
+
+    def _reserve(self, rows):
+        """Make room for `rows` more vectors, doubling the preallocated space when full.
+
+        Growing copies the rows into the next generation's file instead of resizing the mapped
+        one, so views returned by vectors() earlier stay valid.
+        """
+        needed = self.count + rows
+        if needed > len(self._offsets):
+            grown = np.zeros(max(needed, 2 * len(self._offsets)), dtype=np.int64)
+            grown[:self.count] = self._offsets[:self.count]
+            self._offsets = grown
+
+        if needed <= self.capacity:
+            return
+        new_capacity = max(needed, 2 * self.capacity, INITIAL_CAPACITY)
+        if self._matrix is None and not os.path.exists(self.vectors_path):
+            # Nothing maps the file yet, so it can simply be created at full size
+            with open(self.vectors_path, "wb") as f:
+                f.truncate(new_capacity * self.row_bytes)
+        else:
+            self._grow_into_next_generation(new_capacity)
+        self.capacity = new_capacity
+        self._remap()
+
+    def _grow_into_next_generation(self, capacity):
+        new_path = self._vectors_path(self.vectors_generation + 1)
+        remaining = self.count * self.row_bytes
+        with open(self.vectors_path, "rb") as src, open(new_path, "wb") as dst:
+            while remaining > 0:
+                chunk = src.read(min(COPY_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                dst.write(chunk)
+                remaining -= len(chunk)
+            dst.truncate(capacity * self.row_bytes)
+        if self._vector_writer is not None:
+            self._vector_writer.close()
+            self._vector_writer = None
+        # The old file stays committed (and readable through old views) until the next checkpoint
+        self._stale_vector_paths.append(self.vectors_path)
+        self.vectors_generation += 1
+        self.vectors_path = new_path
+
+    # ----------------------------------------------------------------------------------
+    # Reads
+    # ----------------------------------------------------------------------------------
+
+    def vectors(self) -> np.ndarray:
+        """Return a zero-copy, read-only (count, dim) view of all stored vectors."""
+        if self._matrix is None or self.count == 0:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+        return self._matrix[:self.count]
+
+    def metadata(self, i):
+        """Return the metadata record for memory i, read from the log on demand."""
+        return self.record_at(self.offset(i))
+
+    def offset(self, i):
+        """Byte offset of memory i's current record in the metadata log."""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(f"memory index {i} out of range")
+        return int(self._offsets[i])
+
+    def record_at(self, offset):
+        """Read the log record starting at `offset` (e.g. an older version of a memory's metadata)."""
+        with self._lock:
+            if self._reader is None:
+                self._reader = open(self.log_path, "rb")
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        return json.loads(line.decode("utf-8"))
+
+    def records_since(self, position):
+        """(offset, record) for every log record written at or after log byte `position`, in order."""
+        with self._lock:
+            if self._reader is None:
+                self._reader = open(self.log_path, "rb")
+            self._reader.seek(position)
+            data = self._reader.read(self.log_size - position)
+        records = []
+        for line in data.splitlines(keepends=True):
+            records.append((position, json.loads(line.decode("utf-8"))))
+            position += len(line)
+        return records
+
+    def last_seen_rows(self) -> np.ndarray:
+        """Per memory, the newest memory whose current record precedes (or is) its own in the log.
+
+        Records are appended in order, so a memory whose metadata was updated (e.g. a merge)
+        after newer memories were stored ranks among them; others map to their own index.
+        """
+        offsets = self._offsets[:self.count]
+        later_min = np.minimum.accumulate(offsets[::-1])[::-1]  # min offset of rows j..count-1
+        rows = np.arange(self.count)
+        moved = np.flatnonzero(offsets[:-1] > later_min[1:])
+        rows[moved] = np.searchsorted(later_min, offsets[moved], side="right") - 1
+        return rows
+
+    def text(self, i):
+        return self.metadata(i)["response"]
+
+    # ----------------------------------------------------------------------------------
+    # Writes
+    # ----------------------------------------------------------------------------------
+
+    def append(self, vector, metadata):
+        """Append one memory (vector + metadata record) through the write-ahead log.
+
+        The memory is readable immediately; it is durable once its WAL group is fsynced and
+        committed to the manifest at the next checkpoint().
+        """
+        vec = np.asarray(vector).reshape(-1)
+        if self.dim is None:
+            self.dim = len(vec)
+        if len(vec) != self.dim:
+            raise ValueError(f"Vector has dim {len(vec)}, memory store expects {self.dim}")
+
+        line = (json.dumps(metadata) + "\n").encode("utf-8")
+        vec_bytes = vec.astype(self.dtype).tobytes()
+        payload = vec_bytes + line
+
+        with self._lock:
+            if self.count == 0 and not self.exists():
+                # An empty manifest fixes dim/dtype so the WAL can be replayed before the first checkpoint
+                os.makedirs(self.db_dir, exist_ok=True)
+                self._write_manifest()
+            if self._wal is None:
+                self._wal = open(self.wal_path, "ab")
+            self._wal.write(_WAL_HEADER.pack(len(payload), self.count, zlib.crc32(payload)) + payload)
+            self._wal.flush()
+            self._apply(vec_bytes, line)
+
+            self._wrote_wal_record()
+
+    def update_metadata(self, i, metadata):
+        """Append a new metadata record for existing memory i and point the memory at it.
+
+        The previous record stays in the log. Goes through the WAL like append().
+        """
+        if not 0 <= i < self.count:
+            raise IndexError(f"memory index {i} out of range")
+        line = (json.dumps(metadata) + "\n").encode("utf-8")
+
+        with self._lock:
+            if self._wal is None:
+                self._wal = open(self.wal_path, "ab")
+            self._wal.write(_WAL_HEADER.pack(len(line), i | _WAL_UPDATE, zlib.crc32(line)) + line)
+            self._wal.flush()
+            self._apply_update(i, line)
+
+            self._wrote_wal_record()
+
+    def checkpoint(self):
+        """Sync the data files, commit everything appended so far to the manifest and empty the WAL."""
+        with self._lock:
+            if self.count == self.committed_count and not self._updated_rows:
+                return
+            for writer in (self._vector_writer, self._log_writer):
+                if writer is not None:
+                    writer.flush()
+                    os.fsync(writer.fileno())
+            with open(self.offsets_path, "ab") as f:
+                f.write(self._offsets[self.committed_count:self.count].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            if self._updated_rows:
+                # In-place offsets point past the committed log until the manifest is written;
+                # the synced WAL re-applies the updates if we crash before that
+                self._sync_wal()
+                with open(self.offsets_path, "r+b") as f:
+                    for i in sorted(self._updated_rows):
+                        f.seek(i * 8)
+                        f.write(self._offsets[i:i + 1].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._updated_rows.clear()
+            self._write_manifest()
+            self.committed_count = self.count
+            self._remove_stale_vector_files()
+
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            with open(self.wal_path, "wb"):
+                pass
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def _wrote_wal_record(self):
+        """Sync the WAL if the group is full or due; otherwise make sure a timer syncs it in time."""
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync_wal()
+        elif self._sync_timer is None:
+            # Without it an idle writer would leave the last group unsynced until its next append
+            self._sync_timer = threading.Timer(self.fsync_interval, self._timed_sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+
+    def _timed_sync(self):
+        with self._lock:
+            self._sync_timer = None
+            if self._unsynced:
+                self._sync_wal()
+
+    def _sync_wal(self):
+        if self._wal is not None:
+            os.fsync(self._wal.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _apply(self, vec_bytes, line):
+        """Write one memory's vector row and log line (unsynced) and make it visible to readers."""
+        self._reserve(1)
+        if self._vector_writer is None:
+            self._vector_writer = open(self.vectors_path, "r+b")
+        self._vector_writer.seek(self.count * self.row_bytes)
+        self._vector_writer.write(vec_bytes)
+        self._vector_writer.flush()  # readers go through the memory map
+        self._offsets[self.count] = self._append_log_line(line)
+        self.count += 1
+
+    def _append_log_line(self, line):
+        if self._log_writer is None:
+            self._log_writer = open(self.log_path, "ab")
+        self._log_writer.write(line)
+        self._log_writer.flush()
+        offset = self.log_size
+        self.log_size += len(line)
+        return offset
+
+    def _apply_update(self, i, line):
+        self._offsets[i] = self._append_log_line(line)
+        if i < self.committed_count:
+            self._updated_rows.add(i)
+
+    def _replay_wal(self):
+        """Re-apply WAL records past the committed count; stops at the first torn or corrupt record."""
+        if not os.path.exists(self.wal_path):
+            return 0
+        with open(self.wal_path, "rb") as f:
+            data = f.read()
+
+        replayed = 0
+        pos = 0
+        with self._lock:
+            while pos + _WAL_HEADER.size <= len(data):
+                length, index, crc = _WAL_HEADER.unpack_from(data, pos)
+                end = pos + _WAL_HEADER.size + length
+                if end > len(data):
+                    break
+                payload = data[pos + _WAL_HEADER.size:end]
+                if zlib.crc32(payload) != crc:
+                    break
+                if index & _WAL_UPDATE:
+                    row = index & ~_WAL_UPDATE
+                    if row >= self.count:
+                        break
+                    # Re-applying an update that was already committed only repeats its log line
+                    self._apply_update(row, payload)
+                    replayed += 1
+                elif index > self.count:
+                    break
+                elif index == self.count:
+                    self._apply(payload[:self.row_bytes], payload[self.row_bytes:])
+                    replayed += 1
+                pos = end
+        return replayed
+
+    def create_from(self, vectors, log_lines):
+        """Write a fresh store from existing vectors and raw log lines (used for migration).
+
+        Line i of the log becomes the record of vector i; any extra lines are kept in the log
+        but do not belong to a memory.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype).reshape(len(vectors), -1)
+        if len(log_lines) < len(vectors):
+            raise ValueError("Fewer log lines than vectors")
+
+        os.makedirs(self.db_dir, exist_ok=True)
+        offsets = np.zeros(len(vectors), dtype=np.int64)
+        position = 0
+        with open(self.log_path, "wb") as f:
+            for i, line in enumerate(log_lines):
+                if i < len(vectors):
+                    offsets[i] = position
+                f.write(line)
+                position += len(line)
+        vectors.tofile(self.vectors_path)
+        offsets.tofile(self.offsets_path)
+        if os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
+
+        self.dim = vectors.shape[1] if len(vectors) else self.dim
+        self.count = len(vectors)
+        self.capacity = len(vectors)
+        self.log_size = position
+        self._offsets = np.zeros(max(self.count, INITIAL_CAPACITY), dtype=np.int64)
+        self._offsets[:self.count] = offsets
+        self._remap()
+        self._write_manifest()
+        self.committed_count = self.count
+
+    def close(self):
+        self.checkpoint()
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            for name in ("_reader", "_wal", "_log_writer", "_vector_writer"):
+                handle = getattr(self, name)
+                if handle is not None:
+                    handle.close()
+                    setattr(self, name, None)
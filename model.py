@@ -4,15 +4,36 @@
 from __future__ import annotations
 
 import os
+import time
+import atexit
+import json
+import hashlib
 import threading
-from typing import List, Dict, Any
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Tuple
 
-from llama_cpp import Llama  # type: ignore
+import numpy as np
+from llama_cpp import Llama, LlamaGrammar  # type: ignore
 from sentence_transformers import SentenceTransformer
 
-from config import IDENTITY_PREFIX, LLAMA_MODEL_PATH, FULL_PRINT
+from config import (
+    IDENTITY_PREFIX,
+    LLAMA_MODEL_PATH,
+    LLM_PREFIX_CACHE_SIZE,
+    LLM_SEED,
+    FULL_PRINT,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_PROCESSES,
+)
 from state_of_mind import get_identity_summary
 from memory import memory_db
+from embedding_cache import embedding_cache
+from llm_cache import llm_cache
+from pipeline import background_writes
+from telemetry import telemetry, span
+from stop_conditions import StopPredicate
 from helpers import format_prompt_for_display, strip_surrounding_quotes
 
 # --------------------------------------------------------------------------------------
@@ -23,6 +44,10 @@ _llm_instance: Llama | None = None
 _llm_lock = threading.Lock()
 
 
+def _model_path() -> str:
+    return os.getenv("LLAMA_MODEL_PATH", LLAMA_MODEL_PATH)
+
+
 def _get_llm() -> Llama:
     """Load the GGUF model once and reuse it for subsequent calls."""
     global _llm_instance
@@ -30,7 +55,7 @@ def _get_llm() -> Llama:
     if _llm_instance is None:
         with _llm_lock:
             if _llm_instance is None:  # double-check inside the lock
-                model_path = os.getenv("LLAMA_MODEL_PATH", LLAMA_MODEL_PATH)
+                model_path = _model_path()
                 
                 if not os.path.isfile(model_path):
                     raise FileNotFoundError(
@@ -50,9 +75,108 @@ def _get_llm() -> Llama:
     return _llm_instance
 
 
+# --------------------------------------------------------------------------------------
+# Shared-prefix state cache
+# Every prompt starts with the identity prefix, and most with a fixed [Instruction] block.
+# After evaluating such a prefix the llama state is saved; restoring it before the next
+# completion lets llama.cpp's own prefix matching skip straight to the suffix.
+# --------------------------------------------------------------------------------------
+
+_prefix_states: "OrderedDict[str, Any]" = OrderedDict()
+_prefix_summary: str | None = None
+# Instruction blocks seen once; a block gets a snapshot the second time it is used, so
+# one-off instructions (e.g. a Reddit post) don't evict the reusable ones
+_seen_instructions: "OrderedDict[str, None]" = OrderedDict()
+_SEEN_INSTRUCTIONS_LIMIT = 64
+
+
+def _prefix_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def invalidate_prefix_cache() -> None:
+    """Drop all saved prefix states (called when the identity summary changes)."""
+    global _prefix_summary
+    _prefix_states.clear()
+    _prefix_summary = None
+
+
+def _eval_prefix(llm: Llama, text: str) -> None:
+    """Bring the llama context to exactly the tokens of `text`, evaluating only what is missing."""
+    # The last token is left out: it may merge with the start of the suffix when tokenized together
+    tokens = llm.tokenize(text.encode("utf-8"), special=True)[:-1]
+    n_past = llm.n_tokens
+    if n_past > len(tokens) or list(llm.input_ids[:n_past]) != tokens[:n_past]:
+        llm.reset()
+        n_past = 0
+    if n_past < len(tokens):
+        llm.eval(tokens[n_past:])
+
+
+def _restore_prefix(llm: Llama, identity_summary: str, levels: list[tuple[str, bool]]) -> None:
+    """Load the deepest saved prefix state, then evaluate and save the levels that should be cached.
+
+    `levels` are (prefix text, cacheable) pairs, each extending the previous one.
+    """
+    global _prefix_summary
+    if LLM_PREFIX_CACHE_SIZE <= 0:
+        return
+    if identity_summary != _prefix_summary:
+        invalidate_prefix_cache()
+        _prefix_summary = identity_summary
+
+    start = 0
+    for depth in range(len(levels) - 1, -1, -1):
+        key = _prefix_key(levels[depth][0])
+        if key in _prefix_states:
+            llm.load_state(_prefix_states[key])
+            _prefix_states.move_to_end(key)
+            start = depth + 1
+            break
+    else:
+        llm.reset()
+
+    for text, cacheable in levels[start:]:
+        if not cacheable:
+            break
+        _eval_prefix(llm, text)
+        _prefix_states[_prefix_key(text)] = llm.save_state()
+        while len(_prefix_states) > LLM_PREFIX_CACHE_SIZE:
+            _prefix_states.popitem(last=False)
+
+
+def _prefix_levels(identity_prefix: str, instruction_block: str | None) -> list[tuple[str, bool]]:
+    levels = [(identity_prefix + "\n\n", True)]
+    if instruction_block:
+        key = _prefix_key(instruction_block)
+        reused = key in _seen_instructions
+        _seen_instructions[key] = None
+        _seen_instructions.move_to_end(key)
+        while len(_seen_instructions) > _SEEN_INSTRUCTIONS_LIMIT:
+            _seen_instructions.popitem(last=False)
+        levels.append((identity_prefix + "\n\n" + instruction_block + "\n\n", reused))
+    return levels
+
+
+# --------------------------------------------------------------------------------------
+# Grammar-constrained decoding
+# --------------------------------------------------------------------------------------
+
+_grammars: Dict[str, LlamaGrammar] = {}
+
+
+def _grammar_for_schema(schema: Dict[str, Any]) -> LlamaGrammar:
+    """Build (once per schema) the llama.cpp GBNF grammar that only admits JSON matching `schema`."""
+    key = json.dumps(schema, sort_keys=True)
+    if key not in _grammars:
+        _grammars[key] = LlamaGrammar.from_json_schema(key, verbose=FULL_PRINT)
+    return _grammars[key]
+
+
 # --------------------------------------------------------------------------------------
 # Embeddings
 # Now using a fast embedding model (all-MiniLM) via sentence-transformers
+# Repeated texts are served from embedding_cache instead of a forward pass
 # --------------------------------------------------------------------------------------
 
 _embedding_model = None
@@ -63,16 +187,88 @@ def get_embedding_model():
     if _embedding_model is None:
         with _embedding_lock:
             if _embedding_model is None:
-                _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+                _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
     return _embedding_model
 
-def embed_text(text: str) -> List[float]:
+def embed_text(text: str) -> np.ndarray:
     """Return an embedding for the given text using a fast embedding model (all-MiniLM).
     Uses sentence-transformers all-MiniLM-L6-v2 for efficient embeddings.
+    The embedding is a read-only float32 array, served from the embedding cache when possible.
     """
+    with span("embed_text") as trace:
+        cached = embedding_cache.get(text)
+        trace.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        model = get_embedding_model()
+        embedding = model.encode(text)
+        return embedding_cache.put(text, embedding)
+
+
+_embedding_pool = None
+
+
+def _get_embedding_pool():
+    """Start the sentence-transformers multi-process pool once, if enabled and running on CPU."""
+    global _embedding_pool
+    if EMBEDDING_PROCESSES <= 1:
+        return None
     model = get_embedding_model()
-    embedding = model.encode(text)
-    return embedding.tolist()
+    if model.device.type != "cpu":
+        return None
+    if _embedding_pool is None:
+        with _embedding_lock:
+            if _embedding_pool is None:
+                _embedding_pool = model.start_multi_process_pool(["cpu"] * EMBEDDING_PROCESSES)
+                atexit.register(_stop_embedding_pool)
+    return _embedding_pool
+
+
+def _stop_embedding_pool():
+    global _embedding_pool
+    if _embedding_pool is not None:
+        get_embedding_model().stop_multi_process_pool(_embedding_pool)
+        _embedding_pool = None
+
+
+def embed_texts(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE, persist: bool = True) -> np.ndarray:
+    """Return an (N, dim) float32 matrix of embeddings, row i belonging to texts[i].
+
+    Cached texts are looked up first. The rest are encoded once per distinct text,
+    longest-first so each batch of `batch_size` pads to similar lengths, then put back in
+    input order. Large inputs are spread over a multi-process pool when
+    EMBEDDING_PROCESSES > 1 and the model runs on CPU. With persist=False new embeddings
+    skip the cache's disk tier (for bulk builds whose output is stored elsewhere).
+    """
+    model = get_embedding_model()
+    dim = model.get_sentence_embedding_dimension()
+    embeddings = np.empty((len(texts), dim), dtype=np.float32)
+
+    missing: Dict[str, List[int]] = {}  # distinct uncached text -> its rows
+    for i, text in enumerate(texts):
+        if text in missing:
+            missing[text].append(i)
+            continue
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            embeddings[i] = cached
+        else:
+            missing[text] = [i]
+    if not missing:
+        return embeddings
+
+    sorted_texts = sorted(missing, key=lambda text: -len(text))
+
+    pool = _get_embedding_pool() if len(sorted_texts) >= batch_size * max(EMBEDDING_PROCESSES, 1) else None
+    if pool is not None:
+        encoded = model.encode_multi_process(sorted_texts, pool, batch_size=batch_size)
+    else:
+        encoded = model.encode(sorted_texts, batch_size=batch_size, convert_to_numpy=True)
+
+    for text, vector in zip(sorted_texts, encoded):
+        embeddings[missing[text]] = vector
+        embedding_cache.put(text, vector, disk=persist)
+    return embeddings
 
 
 # --------------------------------------------------------------------------------------
@@ -86,20 +282,29 @@ def call_llm(*,
             system_prompt: str | None = None, 
             user_prompt: str | None = None, 
             temperature: float = 0.7, 
-            max_tokens: int = 128) -> str:
+            max_tokens: int = 128,
+            stop_when: StopPredicate | None = None,
+            json_schema: Dict[str, Any] | None = None,
+            postprocess: Callable[[str], str] | None = None) -> str:
     """Generate a response using the local LLM model.
     
     Creates a unified prompt from system/user input and manages storing 
-    responses in memory if requested.
+    responses in memory if requested. With `stop_when` (see stop_conditions.py)
+    decoding of the streamed completion stops as soon as the predicate asks for it.
+    With `json_schema` decoding is constrained by a GBNF grammar built from the schema,
+    so the reply is always JSON of that shape. `postprocess` cleans the reply (after
+    quote stripping) before it is logged, stored and returned; the cache keeps the raw reply.
     """
     # Build unified prompt with identity context
     identity_summary = get_identity_summary()
     identity_prefix = IDENTITY_PREFIX.replace("{CURRENT_SUMMARY}", identity_summary)
 
     unified_prompt_parts: list[str] = [identity_prefix]
+    instruction_block = None
 
     if system_prompt:
-        unified_prompt_parts.append("[Instruction]\n" + system_prompt.strip())
+        instruction_block = "[Instruction]\n" + system_prompt.strip()
+        unified_prompt_parts.append(instruction_block)
     if user_prompt:
         unified_prompt_parts.append("[Input]\n" + user_prompt.strip())
     if prompt and not (system_prompt or user_prompt):
@@ -112,25 +317,157 @@ def call_llm(*,
     display_prompt = format_prompt_for_display(unified_prompt)
     print(f"🤖 Prompting model w/prompt -->\n--- BEGIN PROMPT ---\n{display_prompt}\n--- END PROMPT ---")
 
-    # Call the local LLM with the original unmodified prompt
-    llm = _get_llm()
-    llm_response = llm.create_completion(
-        prompt=unified_prompt,
-        temperature=temperature,
-        max_tokens=max_tokens,
-    )
-
-    reply: str = llm_response.get("choices", [{}])[0].get("text", "").strip()
+    with span("call_llm", response_type=response_type) as trace:
+        # Recorded completions are served without touching (or even loading) the model
+        cache_key = llm_cache.key(unified_prompt, temperature, max_tokens, LLM_SEED, _model_path(), json_schema)
+        reply = llm_cache.get(cache_key)
+        trace.set(replayed=reply is not None)
+        if reply is None:
+            reply = _generate(unified_prompt, identity_summary, identity_prefix, instruction_block,
+                              temperature, max_tokens, stop_when, json_schema)
+            llm_cache.put(cache_key, reply)
+        else:
+            print("📼 Replaying recorded LLM response")
     
     # Strip surrounding quotes if present
     reply = strip_surrounding_quotes(reply)
+    if postprocess is not None:
+        reply = postprocess(reply)
     
     print(f"🤖 LLM Responded -->\n{reply}")
 
-    # Store in memory if requested
+    # Store in memory if requested; embedding and insertion run on the ordered background
+    # writer so they overlap the next generation (readers see them via memory_snapshot)
     if store_in_memory:
         persisted_text = reply[7:] if response_type == "tweet" and reply.startswith("Tweet: ") else reply
-        vector = embed_text(persisted_text)
-        memory_db.add(persisted_text, vector, response_type=response_type)
+        with _memory_write_lock:
+            _pending_memories.append(persisted_text)
+        background_writes.submit(_store_memory, persisted_text, response_type)
+
+    return reply
+
+
+def _generate(unified_prompt: str, identity_summary: str, identity_prefix: str, instruction_block: str | None,
+              temperature: float, max_tokens: int, stop_when: StopPredicate | None,
+              json_schema: Dict[str, Any] | None) -> str:
+    """Run the local LLM on the unified prompt and return the stripped completion text."""
+    # Call the local LLM with the original unmodified prompt
+    llm = _get_llm()
+    with span("llm_prefix_restore"):
+        try:
+            _restore_prefix(llm, identity_summary, _prefix_levels(identity_prefix, instruction_block))
+        except Exception as e:
+            # The cache is only an accelerator; fall back to evaluating the full prompt
+            print(f"⚠️ Prefix state cache unavailable: {e}")
+            invalidate_prefix_cache()
+    completion_args: Dict[str, Any] = {
+        "prompt": unified_prompt,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if LLM_SEED is not None:
+        completion_args["seed"] = LLM_SEED
+    if json_schema is not None:
+        completion_args["grammar"] = _grammar_for_schema(json_schema)
+
+    # Every completion is streamed, so time to first token and decode rate are measured the
+    # same way whether or not a stop predicate can end it early
+    path = "full" if stop_when is None else "stop_when"
+    with span("llm_generate", path=path) as trace:
+        started = time.perf_counter()
+        reply, generated_tokens, first_token_at = _stream_completion(llm, completion_args, stop_when)
+        reply = reply.strip()
+        prompt_tokens = len(llm.tokenize(unified_prompt.encode("utf-8"), special=True)) if telemetry.enabled else None
+        _record_generation(trace, path, started, prompt_tokens, generated_tokens, first_token_at)
+    return reply
+
 
-    return reply 
\ No newline at end of file
+def _stream_completion(llm: Llama, completion_args: Dict[str, Any], stop_when: StopPredicate | None):
+    """Stream a completion, stopping as soon as `stop_when` (if any) returns a cut position.
+
+    Returns (text, streamed chunks (one per token), perf_counter time of the first chunk or None).
+    """
+    text = ""
+    chunks = 0
+    first_token_at = None
+    stream = llm.create_completion(**completion_args, stream=True)
+    try:
+        for chunk in stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            chunks += 1
+            text += chunk.get("choices", [{}])[0].get("text", "")
+            if stop_when is None:
+                continue
+            cut = stop_when(text)
+            if cut is not None:
+                return text[:cut], chunks, first_token_at
+    finally:
+        stream.close()  # stops decoding when we leave early
+    return text, chunks, first_token_at
+
+
+def _record_generation(trace, path, started, prompt_tokens, generated_tokens, first_token_at):
+    """Attach token counts, time to first token and decode throughput to the generation span.
+
+    Metrics are labelled with the completion `path` ("full" or "stop_when").
+    """
+    elapsed = time.perf_counter() - started
+    if prompt_tokens is not None:
+        trace.set(prompt_tokens=prompt_tokens)
+        telemetry.inc("llm_prompt_tokens", prompt_tokens, path=path)
+    if first_token_at is not None:
+        ttft = first_token_at - started
+        trace.set(time_to_first_token_ms=round(ttft * 1000, 3))
+        telemetry.observe("llm_time_to_first_token_seconds", ttft, path=path)
+    if generated_tokens:
+        # Decode rate excludes prompt evaluation (everything up to the first token)
+        decode_seconds = elapsed - (first_token_at - started if first_token_at is not None else 0)
+        tokens_per_second = generated_tokens / decode_seconds if decode_seconds > 0 else 0.0
+        trace.set(generated_tokens=generated_tokens, tokens_per_second=round(tokens_per_second, 2))
+        telemetry.inc("llm_generated_tokens", generated_tokens, path=path)
+        telemetry.observe("llm_tokens_per_second", tokens_per_second, path=path)
+
+
+# --------------------------------------------------------------------------------------
+# Memory writes
+# Replies are embedded and inserted by the background writer, in submission order. Until
+# then their texts wait in a FIFO of pending memories, and readers see the committed rows
+# plus that queue instead of draining the writer, so inserts overlap the next LLM calls.
+# --------------------------------------------------------------------------------------
+
+_pending_memories: "deque[str]" = deque()
+# Held while a memory is inserted (and leaves the queue) and while a reader holds a snapshot
+_memory_write_lock = threading.Lock()
+
+
+def _store_memory(text: str, response_type: str) -> None:
+    try:
+        vector = embed_text(text)
+    except Exception:
+        with _memory_write_lock:
+            _pending_memories.popleft()
+        raise
+    with _memory_write_lock:
+        try:
+            memory_db.add(text, vector, response_type=response_type)
+        finally:
+            _pending_memories.popleft()
+
+
+@contextmanager
+def memory_snapshot(vectors: bool = True) -> Iterator[List[Tuple[str, np.ndarray | None]]]:
+    """Hold off memory inserts and yield the pending memories as (text, vector) pairs, oldest first.
+
+    Inside the block memory_db holds every committed memory and the pending ones are the
+    memories that will follow it, in that order (with consolidation on, one may yet be merged
+    into an existing memory instead). Pending texts are embedded before the lock is taken,
+    so the writer is only held up by the search itself; with `vectors=False` the vectors are None.
+    """
+    if vectors:
+        with _memory_write_lock:
+            queued = list(_pending_memories)
+        for text in queued:
+            embed_text(text)  # cached for the writer, and for the lookups below
+    with _memory_write_lock:
+        yield [(text, embed_text(text) if vectors else None) for text in _pending_memories]
@@ -6,83 +6,83 @@ import random
 from config import (
     PERCEPTION_SYSTEM_PROMPT, 
     PERCEPTIONS_FILE_PATH,
+    PERCEPTIONS_INDEX_DIR,
     PERCEPTION_SOURCES,
-    REDDIT_PERCEPTION_CHANCE
+    REDDIT_PERCEPTION_CHANCE,
+    PERCEPTION_PREFETCH_DEPTH
 )
 from model import call_llm
+from prefetch import Prefetcher
+from telemetry import traced
+from perception_corpus import PerceptionCorpus
+from state_of_mind import get_followed_subreddits
 
 # Import conditionally to handle when datasets package is not installed
 try:
-    from reddit_perception import reddit_perception_phase
+    from reddit_perception import prepare_reddit_perception, mark_post_seen, release_post
     REDDIT_AVAILABLE = True
 except (ImportError, Exception) as e:
     print(f"⚠️ Reddit perception not available: {e}")
     REDDIT_AVAILABLE = False
 
-# Keep track of the current position in the perceptions file
-perception_pointer = 0
-
-def parse_tweet_block(lines):
-    author = None
-    text = None
-    
-    for line in lines:
-        if line.startswith('Author:'):
-            author = line[len('Author:'):].strip()
-        elif line.startswith('Text:'):
-            text = line[len('Text:'):].strip()
-            
-    if author and text:
-        return f"@{author}\n{text}"
-    return None
+# Reads perception tweets sequentially through a persisted block index and cursor
+perception_corpus = PerceptionCorpus(PERCEPTIONS_FILE_PATH, PERCEPTIONS_INDEX_DIR)
 
 def read_one_perception():
-    global perception_pointer
-    
-    with open(PERCEPTIONS_FILE_PATH, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    
-    tweet_blocks = []
-    current_block = []
-    
-    for line in lines:
-        line = line.strip()
-        
-        if line == '[Tweet]':
-            current_block = []  # Start a new block
-        elif line == '---':
-            if current_block:
-                tweet_blocks.append(current_block)
-                current_block = []
-        else:
-            current_block.append(line)
-            
-    if current_block:
-        tweet_blocks.append(current_block)
-    
-    if perception_pointer < len(tweet_blocks):
-        tweet = parse_tweet_block(tweet_blocks[perception_pointer])
-        perception_pointer += 1
-        return tweet
-    
-    return None
+    return perception_corpus.next()
 
-def twitter_perception_phase():
-    """Run the Twitter perception phase"""
-    tweet = read_one_perception()
+def prepare_twitter_perception():
+    """Read the next perception tweet and build its prompt-ready perception item.
+
+    The corpus cursor only moves past the tweet when the item is consumed (consume_perception).
+    """
+    tweet, position = perception_corpus.take()
     
     if not tweet:
         print("❌ No perception tweet found.")
         return None
         
+    return {
+        "source": "twitter",
+        "system_prompt": PERCEPTION_SYSTEM_PROMPT,
+        "user_prompt": tweet,
+        "response_type": "twitter_perception",
+        "cursor": position,
+    }
+
+def consume_perception(item):
+    """Record a prepared item as used: commit the Twitter cursor past it or mark its Reddit post seen"""
+    if item["source"] == "twitter":
+        perception_corpus.commit(item["cursor"])
+    elif item["source"] == "reddit":
+        mark_post_seen(item["row"])
+
+def discard_perception(item):
+    """Give back a prepared item that won't be used, so its Reddit post can be drawn again"""
+    if item and item["source"] == "reddit":
+        release_post(item["row"])
+
+def run_perception(item):
+    """Prompt the LLM with a prepared perception item"""
+    if item.get("log"):
+        print(item["log"])
+        
     response = call_llm(
-        system_prompt=PERCEPTION_SYSTEM_PROMPT, 
-        user_prompt=tweet, 
-        response_type="twitter_perception"
+        system_prompt=item["system_prompt"], 
+        user_prompt=item.get("user_prompt"), 
+        response_type=item["response_type"]
     )
     
     return response
 
+def twitter_perception_phase():
+    """Run the Twitter perception phase"""
+    item = prepare_twitter_perception()
+    if not item:
+        return None
+    consume_perception(item)
+    return run_perception(item)
+
 def choose_perception_source():
     """Choose which perception source to use (Twitter or Reddit)"""
     available_sources = list(PERCEPTION_SOURCES)
@@ -106,16 +106,16 @@ def choose_perception_source():
     # Default to first available source
     return available_sources[0]
 
-def perception_phase():
-    """Run the perception phase, choosing between Twitter and Reddit sources"""
+def prepare_perception():
+    """Choose a perception source and build a prompt-ready item, without calling the LLM"""
     source = choose_perception_source()
     
     if source == "reddit" and REDDIT_AVAILABLE:
         print("🔄 Using Reddit for perception")
         try:
-            reddit_result = reddit_perception_phase()
-            if reddit_result:
-                return reddit_result
+            reddit_item = prepare_reddit_perception()
+            if reddit_item:
+                return reddit_item
             print("❌ Reddit perception failed, falling back to Twitter")
         except Exception as e:
             print(f"❌ Error in Reddit perception: {e}")
@@ -125,7 +125,34 @@ def perception_phase():
         
     if source == "twitter":
         print("🔄 Using Twitter for perception")
-        return twitter_perception_phase()
+        return prepare_twitter_perception()
     else:
         print("❌ No perception source available")
-        return None 
\ No newline at end of file
+        return None
+
+# Prepares the next perception items (post sampling, row fetch, formatting) in the background
+# while the LLM is busy, so perception_phase only has to dequeue one. Preparing an item doesn't
+# use it up: the Twitter cursor and Reddit seen marks are committed when it is consumed, so
+# items still queued at shutdown are served again on the next run
+_perception_prefetcher = Prefetcher(prepare_perception, PERCEPTION_PREFETCH_DEPTH, name="perception-prefetch")
+
+def _is_stale(item):
+    """A prefetched Reddit item is stale if reflection has since unfollowed its subreddit"""
+    if not item or item["source"] != "reddit":
+        return False
+    followed = {s.lower().replace("r/", "") for s in get_followed_subreddits()}
+    return item["subreddit"].lower() not in followed
+
+@traced()
+def perception_phase():
+    """Run the perception phase on the next (prefetched) Twitter or Reddit item"""
+    item = _perception_prefetcher.get()
+    while _is_stale(item):
+        print(f"⏭️ Skipping prefetched post from unfollowed r/{item['subreddit']}")
+        discard_perception(item)
+        item = _perception_prefetcher.get()
+        
+    if item is None:
+        return None
+    consume_perception(item)
+    return run_perception(item)
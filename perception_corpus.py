@@ -0,0 +1,206 @@
+# perception_corpus.py
+# Indexed, incremental reader for the Twitter perception corpus.
+#
+# The corpus is a text file of blocks: a "[Tweet]" line starts a block and a "---" line ends it.
+# Instead of re-parsing the whole file per read, the byte range of every finished block is kept
+# in an on-disk index that is extended when the file grows, and the read cursor is persisted, so
+# fetching the next perception is one seek + read and survives restarts. Files in the index dir:
+#   meta.json  - corpus inode, bytes scanned so far and number of indexed blocks (commit point)
+#   blocks.i64 - (start, end) byte offsets of each finished block's lines
+#   cursor     - index of the next block to read
+#
+# Reading a block (take) and using it (commit) are separate steps, so blocks prepared ahead by a
+# prefetcher but never used are read again after a restart.
+
+import os
+import json
+import threading
+
+import numpy as np
+
+META_FILENAME = "meta.json"
+BLOCKS_FILENAME = "blocks.i64"
+CURSOR_FILENAME = "cursor"
+
+TWEET_MARKER = b"[Tweet]"
+END_MARKER = b"---"
+
+
+def parse_tweet_block(lines):
+    author = None
+    text = None
+
+    for line in lines:
+        if line.startswith('Author:'):
+            author = line[len('Author:'):].strip()
+        elif line.startswith('Text:'):
+            text = line[len('Text:'):].strip()
+
+    if author and text:
+        return f"@{author}\n{text}"
+    return None
+
+
+def _write_atomic(path, data: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class PerceptionCorpus:
+    def __init__(self, path, index_dir):
+        self.path = path
+        self.index_dir = index_dir
+        self.meta_path = os.path.join(index_dir, META_FILENAME)
+        self.blocks_path = os.path.join(index_dir, BLOCKS_FILENAME)
+        self.cursor_path = os.path.join(index_dir, CURSOR_FILENAME)
+
+        self.inode = None
+        self.scanned = 0  # bytes of the corpus covered by the index; always at a block boundary
+        self.blocks = np.zeros((0, 2), dtype=np.int64)
+        self.cursor = 0  # committed: blocks before it have been used
+        self._next = 0  # next block to hand out (ahead of cursor while taken blocks are unused)
+        self._lock = threading.Lock()
+        self._opened = False
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def next(self):
+        """Return the next perception tweet (formatted "@author\\ntext"), or None when exhausted.
+
+        Like the original sequential reader, a malformed block still consumes its position.
+        """
+        tweet, position = self.take()
+        if position is not None:
+            self.commit(position)
+        return tweet
+
+    def take(self):
+        """Read the next block without committing it: (tweet or None, position for commit()).
+
+        Returns (None, None) when exhausted.
+        """
+        with self._lock:
+            self._refresh()
+            if self._next < len(self.blocks):
+                start, end = (int(x) for x in self.blocks[self._next])
+                lines = self._read_lines(start, end)
+            else:
+                # A trailing block not yet closed by "---" is served from the unindexed tail
+                tail = self._tail_block() if self._next == len(self.blocks) else None
+                if tail is None:
+                    return None, None
+                lines = tail
+            self._next += 1
+            return parse_tweet_block(lines), self._next
+
+    def commit(self, position):
+        """Persist the cursor past a taken block once its tweet has been used."""
+        with self._lock:
+            if position > self.cursor:
+                self.cursor = position
+                _write_atomic(self.cursor_path, str(self.cursor))
+
+    # ----------------------------------------------------------------------------------
+    # Index maintenance
+    # ----------------------------------------------------------------------------------
+
+    def _open(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            count = meta["blocks"]
+            blocks = np.fromfile(self.blocks_path, dtype=np.int64, count=2 * count) \
+                if os.path.exists(self.blocks_path) else np.zeros(0, dtype=np.int64)
+            if len(blocks) == 2 * count:
+                self.inode = meta["inode"]
+                self.scanned = meta["scanned"]
+                self.blocks = blocks.reshape(-1, 2)
+                # Drop block rows appended after the last committed meta.json
+                if os.path.getsize(self.blocks_path) > self.blocks.nbytes:
+                    with open(self.blocks_path, "r+b") as f:
+                        f.truncate(self.blocks.nbytes)
+        if os.path.exists(self.cursor_path):
+            with open(self.cursor_path, "r", encoding="utf-8") as f:
+                self.cursor = int(f.read().strip() or 0)
+        self._next = max(self._next, self.cursor)
+        self._opened = True
+
+    def _refresh(self):
+        """Index any blocks added since the last scan; rebuild if the file was replaced or truncated."""
+        if not self._opened:
+            self._open()
+        if not os.path.exists(self.path):
+            return
+        st = os.stat(self.path)
+        if st.st_ino != self.inode or st.st_size < self.scanned:
+            if self.inode is not None:
+                print("🔄 Perception corpus changed, rebuilding its index")
+            self.inode = st.st_ino
+            self.scanned = 0
+            self.blocks = np.zeros((0, 2), dtype=np.int64)
+            with open(self.blocks_path, "wb"):
+                pass
+        if st.st_size > self.scanned:
+            self._scan(st.st_size)
+
+    def _scan(self, size):
+        new_blocks = []
+        scanned = self.scanned
+        with open(self.path, "rb") as f:
+            f.seek(self.scanned)
+            offset = self.scanned
+            block_start = None
+            for line in f:
+                if offset >= size:
+                    break
+                line_start = offset
+                offset += len(line)
+                if not line.endswith(b"\n") and offset >= size:
+                    break  # partially written last line; rescanned once complete
+                marker = line.strip()
+                if marker == TWEET_MARKER:
+                    block_start = None  # start a new block
+                elif marker == END_MARKER:
+                    if block_start is not None:
+                        new_blocks.append((block_start, line_start))
+                    block_start = None
+                    scanned = offset
+                elif block_start is None:
+                    block_start = line_start
+
+        if new_blocks or scanned != self.scanned:
+            if new_blocks:
+                rows = np.asarray(new_blocks, dtype=np.int64)
+                with open(self.blocks_path, "ab") as f:
+                    f.write(rows.tobytes())
+                self.blocks = np.concatenate([self.blocks, rows])
+            self.scanned = scanned
+            _write_atomic(self.meta_path, json.dumps({
+                "inode": self.inode,
+                "scanned": self.scanned,
+                "blocks": len(self.blocks),
+            }))
+
+    def _read_lines(self, start, end):
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return [line.strip() for line in data.decode("utf-8").splitlines()]
+
+    def _tail_block(self):
+        """Lines of a block after the last "---" that runs to end of file, if any."""
+        with open(self.path, "rb") as f:
+            f.seek(self.scanned)
+            data = f.read()
+        block = []
+        for line in data.decode("utf-8").splitlines():
+            line = line.strip()
+            if line == TWEET_MARKER.decode():
+                block = []
+            else:
+                block.append(line)
+        return block or None
@@ -0,0 +1,59 @@
+# pipeline.py
+# Background executors that let non-LLM work overlap LLM generation across cycles.
+#
+# `background_writes` runs side effects of a finished generation (embedding + memory insertion,
+# tweet log appends) on a single FIFO worker, so memories are inserted in exactly the order
+# the responses were produced. Memory readers don't wait for it: they read the committed memories
+# plus the queue of pending ones (model.memory_snapshot). `side_tasks` runs independent lookups
+# (e.g. subreddit suggestions) in parallel.
+
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import PIPELINE_BACKGROUND_WRITES
+
+
+class SerialExecutor:
+    """Single-thread FIFO executor that remembers pending work so it can be drained."""
+
+    def __init__(self, name, enabled=True):
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._pending: list[Future] = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self.enabled:
+            future = Future()
+            future.set_result(fn(*args, **kwargs))
+            return future
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(_report_failure)
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(future)
+        return future
+
+    def drain(self):
+        """Block until everything submitted so far has run; failures are reported as they happen."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.exception()
+
+
+def _report_failure(future: Future):
+    """Print a failed background task's traceback as soon as it finishes (nothing else reads it)."""
+    error = future.exception()
+    if error is not None:
+        print(f"❌ Background task failed: {error!r}")
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+
+background_writes = SerialExecutor("background-writes", enabled=PIPELINE_BACKGROUND_WRITES)
+side_tasks = ThreadPoolExecutor(max_workers=2, thread_name_prefix="side-task")
+
+
+def wait_for_background_writes():
+    background_writes.drain()
@@ -0,0 +1,59 @@
+# prefetch.py
+# Bounded background prefetch queue: a worker thread keeps up to `depth` items ready.
+
+import queue
+import threading
+
+
+class Prefetcher:
+    def __init__(self, produce, depth, name="prefetch"):
+        """`produce()` builds one item (None is a valid item, e.g. "nothing available")."""
+        self.produce = produce
+        self.depth = depth
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max(depth, 1))
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        # Free a slot so a worker blocked on a full queue notices the stop flag
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get(self):
+        """Return the next prefetched item, starting the worker on first use."""
+        if self.depth <= 0:
+            return self.produce()
+        self.start()
+        return self._queue.get()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = self.produce()
+            except Exception as e:
+                print(f"❌ Error in {self.name} worker: {e}")
+                item = None
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
@@ -7,7 +7,7 @@ import json
 import random
 import pickle
 import hashlib
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple, Set
 
 import datasets
@@ -24,17 +24,29 @@ from config import (
 )
 from model import call_llm, embed_text
 from state_of_mind import get_followed_subreddits
-from helpers import cosine_similarity
+from subreddit_search import get_subreddit_index
+from subreddit_post_index import SubredditPostIndex
+from subreddit_index_builder import build_subreddit_index
+from seen_posts import SeenPostTracker
+from telemetry import traced
 
-# Cache for seen post IDs
-_seen_post_ids: Set[str] = set()
+# Seen dataset rows (bitmap + journal), and post IDs from the legacy seen_posts.json
+_seen_posts: Optional[SeenPostTracker] = None
+_legacy_seen_post_ids: Set[str] = set()
+# Rows handed out by get_random_post but not yet marked seen (e.g. queued in the perception
+# prefetcher); in memory only, so they are drawable again after a restart
+_reserved_rows: Set[int] = set()
 _cache_file = os.path.join(REDDIT_CACHE_DIR, "seen_posts.json")
 
-# Cache file for subreddit-to-indices
+# Columnar subreddit-to-indices index, and the legacy pickle it is converted from
+SUBREDDIT_INDEX_DIR = os.path.join(REDDIT_CACHE_DIR, "subreddit_index")
 CACHE_FILENAME = os.path.join(REDDIT_CACHE_DIR, "subreddit_index.pkl")
 DATASET_NAME = "fddemarco/pushshift-reddit"
 SPLIT = "train"
-CHECKPOINT_INTERVAL = 5_000_000
+CHECKPOINT_INTERVAL = 5_000_000  # rows per build shard / resumable checkpoint
+
+# Consecutive seen draws before get_random_post falls back to scanning a subreddit's slice
+MAX_SAMPLING_REJECTIONS = 32
 
 # Ensure cache dir exists
 os.makedirs(REDDIT_CACHE_DIR, exist_ok=True)
@@ -42,35 +54,34 @@ os.makedirs(REDDIT_CACHE_DIR, exist_ok=True)
 # Add module-level cache for the local dataset
 _local_dataset = None
 
-def _load_seen_posts():
-    """Load the cache of seen post IDs"""
-    global _seen_post_ids
+# Module-level handle on the memory-mapped subreddit index
+_subreddit_index: Optional[SubredditPostIndex] = None
+
+def _load_seen_posts() -> SeenPostTracker:
+    """Open the seen-post tracker once, along with any legacy seen post IDs"""
+    global _seen_posts, _legacy_seen_post_ids
+    if _seen_posts is not None:
+        return _seen_posts
     
     # Create cache directory if it doesn't exist
     os.makedirs(REDDIT_CACHE_DIR, exist_ok=True)
+    _seen_posts = SeenPostTracker(REDDIT_CACHE_DIR)
     
-    # Load seen posts if the file exists
+    # seen_posts.json (post IDs) is no longer written; it is only consulted so posts seen
+    # before the switch to row indices are not repeated
     if os.path.exists(_cache_file):
         with open(_cache_file, "r", encoding="utf-8") as f:
             try:
-                _seen_post_ids = set(json.load(f))
-                print(f"📝 Loaded {len(_seen_post_ids)} seen post IDs from cache")
+                _legacy_seen_post_ids = set(json.load(f))
+                print(f"📝 Loaded {len(_legacy_seen_post_ids)} legacy seen post IDs from cache")
             except json.JSONDecodeError:
-                _seen_post_ids = set()
-                print("⚠️ Error loading seen posts cache, starting fresh")
-    else:
-        _seen_post_ids = set()
-        print("📝 Starting fresh seen posts cache")
-
-def _save_seen_posts():
-    """Save the set of seen post IDs to cache"""
-    with open(_cache_file, "w", encoding="utf-8") as f:
-        json.dump(list(_seen_post_ids), f)
+                print("⚠️ Error loading legacy seen posts cache, ignoring it")
+    return _seen_posts
 
 def _process_post(post: Dict) -> Dict:
     """Process a post dictionary to prepare it for the model"""
     # Extract year from created_utc timestamp
-    year = datetime.fromtimestamp(post["created_utc"]).year
+    year = datetime.fromtimestamp(post["created_utc"], tz=timezone.utc).year
     
     # Get subreddit without 'r/' prefix
     subreddit = post["subreddit"]
@@ -91,12 +102,47 @@ def _process_post(post: Dict) -> Dict:
         "id": post["id"]
     }
 
+def _iter_unseen_candidates(candidates: np.ndarray, seen_posts: SeenPostTracker):
+    """Yield unseen, unreserved dataset indices from `candidates` in random order, without copying them.
+
+    Random offsets into the (memory-mapped) slice are drawn and rejected by a bitmap lookup
+    when already seen. After MAX_SAMPLING_REJECTIONS consecutive rejections the slice is mostly
+    seen, so the remaining unseen rows are found with one vectorised scan instead. The caller
+    must mark or reserve each yielded index before asking for the next one.
+    """
+    total = len(candidates)
+    rejections = 0
+    while rejections < MAX_SAMPLING_REJECTIONS:
+        idx = int(candidates[random.randrange(total)])
+        if idx in seen_posts or idx in _reserved_rows:
+            rejections += 1
+            continue
+        rejections = 0
+        yield idx
+
+    unseen = candidates[~seen_posts.contains_many(candidates)]
+    for idx in np.random.permutation(unseen):
+        if int(idx) not in _reserved_rows:
+            yield int(idx)
+
+def mark_post_seen(row: int):
+    """Record a post returned by get_random_post as perceived, so it is never drawn again"""
+    _load_seen_posts().mark(row)
+    _reserved_rows.discard(row)
+
+def release_post(row: int):
+    """Give back a post returned by get_random_post that won't be used"""
+    _reserved_rows.discard(row)
+
+@traced()
 def get_random_post() -> Optional[Dict]:
-    """Fetch a random post from the cache based on current preferences (subreddits and time range), avoiding duplicates."""
+    """Fetch a random post from the cache based on current preferences (subreddits and time range), avoiding duplicates.
+
+    The post's dataset row ("row") is reserved, not yet marked seen: pass it to mark_post_seen
+    once the post is used, or to release_post if it won't be.
+    """
     try:
-        # Load seen posts if not already loaded
-        if not _seen_post_ids:
-            _load_seen_posts()
+        seen_posts = _load_seen_posts()
         
         # Get current preferences
         subreddits = get_followed_subreddits()
@@ -104,54 +150,33 @@ def get_random_post() -> Optional[Dict]:
         random_subreddits = subreddits[:]
         random.shuffle(random_subreddits)
         
-        cache = load_subreddit_cache() # This loads and cleans the cache
+        index = load_subreddit_cache()
+        if index is None:
+            return None
         dataset = load_local_dataset()
+        start_year, end_year = parse_time_range(time_range)
 
         for subreddit_name_from_prefs in random_subreddits:
             key = subreddit_name_from_prefs.lower().replace("r/", "")
-            if key not in cache:
+            if key not in index:
                 print(f"❌ Subreddit r/{key} does NOT exist in cache (originally {subreddit_name_from_prefs}).")
                 continue
             
-            start_year, end_year = parse_time_range(time_range)
-            # Ensure candidates are actually tuples from the cache
-            # and that cache[key] is a list of tuples as expected.
-            if not isinstance(cache[key], list):
-                print(f"⚠️ WARNING: cache entry for {key} is not a list, but {type(cache[key])}. Skipping.")
-                continue
-
-            candidates_for_subreddit = []
-            for item in cache[key]:
-                if not isinstance(item, (tuple, list)) or len(item) != 2:
-                    print(f"⚠️ WARNING: Invalid item structure in cache for {key}: {repr(item)}. Skipping.")
-                    continue
-                # item[0] is idx, item[1] is year. Both should be integers after clean_cache.
-                candidates_for_subreddit.append(item) # item should be (int_idx, int_year)
+            # Posts are sorted by year, so the time range is a binary search on the year column
+            current_candidates = index.posts(key, start_year, end_year)
             
-            # Filter by year again, just to be safe, using the integer years from cache
-            current_candidates = [(idx_val, year_val) for idx_val, year_val in candidates_for_subreddit if start_year <= year_val <= end_year]
-            
-            if not current_candidates:
-                print(f"❌ No posts found for r/{key} in time range {time_range} after filtering cleaned cache.")
+            if len(current_candidates) == 0:
+                print(f"❌ No posts found for r/{key} in time range {time_range}.")
                 continue
                 
-            random.shuffle(current_candidates)
-            
-            for idx_from_cache, year_from_cache in current_candidates:
-                # This is the critical point. idx_from_cache should be an integer.
-                print(f"DEBUG: In get_random_post for subreddit '{key}'. Attempting to use idx: {repr(idx_from_cache)}, type: {type(idx_from_cache)}, year: {year_from_cache}")
-                
-                # Ensure idx_from_cache is indeed an integer before int() call, though int(int_val) is fine.
-                if not isinstance(idx_from_cache, int):
-                    print(f"ERROR_EXPECTED: idx_from_cache is {repr(idx_from_cache)} (type {type(idx_from_cache)}), NOT an int, right before int() conversion! This will likely fail.")
-                    # Attempt conversion, which is expected to fail if it's 'present'
-                
-                post = dataset[int(idx_from_cache)] # This is where the error occurs
+            for idx_from_cache in _iter_unseen_candidates(current_candidates, seen_posts):
+                post = dataset[idx_from_cache]
                 post_id = post.get("id")
-                if post_id and post_id not in _seen_post_ids:
-                    _seen_post_ids.add(post_id)
-                    _save_seen_posts()
-                    return _process_post(post)
+                if post_id and post_id not in _legacy_seen_post_ids:
+                    _reserved_rows.add(idx_from_cache)
+                    return {**_process_post(post), "row": idx_from_cache}
+                # Unusable rows are marked right away, so they are never drawn again
+                seen_posts.mark(idx_from_cache)
             
             print(f"❌ All posts for r/{key} in {time_range} have been seen or failed processing.")
         
@@ -164,8 +189,8 @@ def get_random_post() -> Optional[Dict]:
         print(traceback.format_exc())
         return None
 
-def reddit_perception_phase() -> Optional[str]:
-    """Run the Reddit perception phase"""
+def prepare_reddit_perception() -> Optional[Dict]:
+    """Fetch a random post and build its prompt-ready perception item (no LLM call)"""
     # Get a random post
     post = get_random_post()
     
@@ -181,13 +206,30 @@ def reddit_perception_phase() -> Optional[str]:
         body=post["body"]
     )
     
+    return {
+        "source": "reddit",
+        "subreddit": post["subreddit"],
+        "system_prompt": formatted_prompt,
+        "user_prompt": None,
+        "response_type": "reddit_perception",
+        "row": post["row"],
+        "log": f"🔍 Processing Reddit post from r/{post['subreddit']} ({post['year']}): {post['title'][:50]}...",
+    }
+
+def reddit_perception_phase() -> Optional[str]:
+    """Run the Reddit perception phase"""
+    item = prepare_reddit_perception()
+    if not item:
+        return None
+    mark_post_seen(item["row"])
+    
     # Log what we're processing
-    print(f"🔍 Processing Reddit post from r/{post['subreddit']} ({post['year']}): {post['title'][:50]}...")
+    print(item["log"])
     
     # Call the model
     response = call_llm(
-        system_prompt=formatted_prompt,
-        response_type="reddit_perception"
+        system_prompt=item["system_prompt"],
+        response_type=item["response_type"]
     )
     
     return response 
@@ -199,14 +241,14 @@ def post_in_time_range(post, time_range):
     created_utc = post.get("created_utc", None)
     if created_utc is None:
         return False
-    year = datetime.fromtimestamp(created_utc).year
+    year = datetime.fromtimestamp(created_utc, tz=timezone.utc).year
     return start_year <= year <= end_year
 
 def post_year(post) -> Optional[int]:
     created_utc = post.get("created_utc", None)
     if created_utc is None:
         return None
-    return datetime.fromtimestamp(created_utc).year
+    return datetime.fromtimestamp(created_utc, tz=timezone.utc).year
 
 def is_quality_post(post):
     score = post.get("score")
@@ -219,69 +261,40 @@ def is_quality_post(post):
         return False
     return True
 
-def clean_cache(cache):
-    """Clean the cache by removing invalid entries.
-    Each entry should be a tuple (index, year) where both values can be converted to int.
-    Invalid entries are dropped. Returns the cleaned cache dictionary."""
-    cleaned_cache = {}
-    total_invalid = 0
-    for subreddit, posts in cache.items():
-        valid_posts = []
-        for item in posts:
-            try:
-                idx = int(item[0])
-                year = int(item[1])
-                valid_posts.append((idx, year))
-            except Exception:
-                print(f"Invalid entry found in subreddit {subreddit}: {item}")  # Log invalid entry
-                total_invalid += 1
-        if valid_posts:
-            cleaned_cache[subreddit] = valid_posts
-    if total_invalid:
-        print(f"Dropped {total_invalid} invalid entries during cache cleaning.")
-    return cleaned_cache
-
-def build_subreddit_cache():
+def build_subreddit_cache(workers: Optional[int] = None):
+    """Rebuild the subreddit index from the local HuggingFace dataset.
+
+    Rows are filtered column-wise in Arrow batches across a process pool, checkpointing every
+    CHECKPOINT_INTERVAL rows so an interrupted build resumes (see subreddit_index_builder.py).
+    """
+    global _subreddit_index
     print(f"🔄 Building subreddit-to-quality-indices cache (with years) from local HuggingFace dataset...")
-    dataset = datasets.load_dataset(
-        DATASET_NAME,
-        split=SPLIT,
-        verification_mode="no_checks",
-        streaming=False
-    )
-    subreddit_to_indices = {}
-    total = len(dataset)
-    for idx in range(total):
-        post = dataset[idx]
-        subreddit = post.get("subreddit", None)
-        year = post_year(post)
-        if subreddit and year and is_quality_post(post):
-            key = subreddit.lower()
-            if key not in subreddit_to_indices:
-                subreddit_to_indices[key] = []
-            subreddit_to_indices[key].append((idx, year))
-    with open(CACHE_FILENAME, "wb") as f:
-        pickle.dump(subreddit_to_indices, f)
-    print(f"✅ Cache built and saved to {CACHE_FILENAME}.")
-    print(f"Total subreddits indexed: {len(subreddit_to_indices)}")
-    return subreddit_to_indices
-
-def load_subreddit_cache():
-    if not os.path.exists(CACHE_FILENAME):
-        print(f"❌ Cache not found at {CACHE_FILENAME}. Please build the cache using test_cache.py.")
-        return {}
-    with open(CACHE_FILENAME, "rb") as f:
-        original_cache = pickle.load(f)
-    print(f"Loaded cache with {sum(len(v) for v in original_cache.values())} entries before cleaning.")  # Log before cleaning
-    original_entries = sum(len(v) for v in original_cache.values())
-    cleaned_cache = clean_cache(original_cache)
-    cleaned_entries = sum(len(v) for v in cleaned_cache.values())
-    if cleaned_entries < original_entries:
-        with open(CACHE_FILENAME, "wb") as f:
-            pickle.dump(cleaned_cache, f)
-        print(f"Cache updated: dropped {original_entries - cleaned_entries} invalid entries and wrote cleaned cache back to disk.")
-    print(f"✅ Loaded subreddit cache from {CACHE_FILENAME} ({len(cleaned_cache)} subreddits after cleaning)")
-    return cleaned_cache
+    _subreddit_index = None  # release the old mapping before the files are replaced
+    index = build_subreddit_index(DATASET_NAME, SPLIT, SUBREDDIT_INDEX_DIR, CHECKPOINT_INTERVAL, workers=workers)
+    _subreddit_index = index
+    print(f"✅ Cache built and saved to {SUBREDDIT_INDEX_DIR}.")
+    print(f"Total subreddits indexed: {len(index)}")
+    return index
+
+def load_subreddit_cache() -> Optional[SubredditPostIndex]:
+    """Open the memory-mapped subreddit index once per process.
+
+    A legacy subreddit_index.pkl is converted (dropping invalid entries) the first time.
+    """
+    global _subreddit_index
+    if _subreddit_index is not None:
+        return _subreddit_index
+    if not SubredditPostIndex.exists(SUBREDDIT_INDEX_DIR):
+        if not os.path.exists(CACHE_FILENAME):
+            print(f"❌ Cache not found at {SUBREDDIT_INDEX_DIR}. Please build it with build_subreddit_cache().")
+            return None
+        print(f"🔄 Converting legacy cache {CACHE_FILENAME} to columnar index at {SUBREDDIT_INDEX_DIR}...")
+        with open(CACHE_FILENAME, "rb") as f:
+            legacy_cache = pickle.load(f)
+        SubredditPostIndex.from_mapping(SUBREDDIT_INDEX_DIR, legacy_cache)
+    _subreddit_index = SubredditPostIndex.open(SUBREDDIT_INDEX_DIR)
+    print(f"✅ Loaded subreddit cache from {SUBREDDIT_INDEX_DIR} ({len(_subreddit_index)} subreddits, {_subreddit_index.total_posts} posts)")
+    return _subreddit_index
 
 def load_local_dataset():
     global _local_dataset
@@ -303,26 +316,12 @@ def filter_post_by_time(post, time_range=DEFAULT_TIME_RANGE):
     created_utc = post.get("created_utc", None)
     if created_utc is None:
         return False
-    year = datetime.fromtimestamp(created_utc).year
+    year = datetime.fromtimestamp(created_utc, tz=timezone.utc).year
     return start_year <= year <= end_year
 
 def get_random_post_from_subreddit(subreddit: str, time_range=DEFAULT_TIME_RANGE) -> Optional[Dict]:
     """Return a random post from a specific subreddit and time range using the cache."""
-    cache = load_subreddit_cache()
-    dataset = load_local_dataset()
-    key = subreddit.lower().replace("r/", "")
-    if key not in cache:
-        print(f"❌ Subreddit r/{key} does NOT exist in cache.")
-        return None
-    indices = cache[key]
-    # Filter indices by time range
-    filtered_indices = [i for i in indices if filter_post_by_time(dataset[int(i)], time_range)]
-    if not filtered_indices:
-        print(f"❌ No posts found for r/{key} in time range {time_range}.")
-        return None
-    idx = random.choice(filtered_indices)
-    post = dataset[int(idx)]
-    return post
+    return get_random_quality_post(subreddit, time_range)
 
 def parse_time_range(time_range: str) -> Tuple[int, int]:
     years = time_range.split("-")
@@ -331,25 +330,27 @@ def parse_time_range(time_range: str) -> Tuple[int, int]:
     return int(years[0]), int(years[-1])
 
 def get_random_quality_post(subreddit: str, time_range: str = DEFAULT_TIME_RANGE) -> Optional[Dict]:
-    cache = load_subreddit_cache()
+    index = load_subreddit_cache()
+    if index is None:
+        return None
     dataset = load_local_dataset()
     key = subreddit.lower().replace("r/", "")
-    if key not in cache:
+    if key not in index:
         print(f"❌ Subreddit r/{key} does NOT exist in cache.")
         return None
     start_year, end_year = parse_time_range(time_range)
-    candidates = [(idx, year) for (idx, year) in cache[key] if start_year <= year <= end_year]
-    if not candidates:
+    candidates = index.posts(key, start_year, end_year)
+    if len(candidates) == 0:
         print(f"❌ No quality posts found for r/{key} in time range {time_range}.")
         return None
-    idx, year = random.choice(candidates)
+    idx = candidates[random.randrange(len(candidates))]
     post = dataset[int(idx)]
     return post
 
 def print_post(post: Dict):
     print("\n--- Random Quality Reddit Post ---")
     print(f"Subreddit: r/{post.get('subreddit', '')}")
-    print(f"Year: {datetime.fromtimestamp(post['created_utc']).year if 'created_utc' in post else 'N/A'}")
+    print(f"Year: {datetime.fromtimestamp(post['created_utc'], tz=timezone.utc).year if 'created_utc' in post else 'N/A'}")
     print(f"Title: {post.get('title', '')}")
     body = post.get('selftext', '')
     if len(body) > 500:
@@ -360,24 +361,16 @@ def print_post(post: Dict):
     print("-------------------------\n")
 
 def search_reddit_embeddings(query_text: str, top_n: int = 3):
-    EMBEDDED_CACHE_FILENAME = "cache/reddit_cache/embedded_subreddit_index.pkl"
-    if not os.path.exists(EMBEDDED_CACHE_FILENAME):
-        print(f"❌ Embedded subreddit index file not found: {EMBEDDED_CACHE_FILENAME}")
+    """Return the top_n subreddit names most similar to query_text (loaded index, real top-k)."""
+    index = get_subreddit_index()
+    if index is None:
         return []
-    with open(EMBEDDED_CACHE_FILENAME, "rb") as f:
-        embedded_subreddit_cache = pickle.load(f)
     query_embedding = embed_text(query_text)
-    subreddit_scores = []
-    for subreddit, embedding in embedded_subreddit_cache.items():
-        similarity = cosine_similarity(query_embedding, embedding)
-        subreddit_scores.append((similarity, subreddit))
-    top_subreddits = sorted(subreddit_scores, key=lambda x: x[0], reverse=True)[:top_n]
-    return [sub for sim, sub in top_subreddits]
+    return [sub for sub, sim in index.search(query_embedding, k=top_n)]
 
 def main():
     # Import default subreddits and time range from config
     from config import DEFAULT_SUBREDDITS, DEFAULT_TIME_RANGE
-    cache = load_subreddit_cache()
     for subreddit in DEFAULT_SUBREDDITS:
         print(f"Fetching post for subreddit: r/{subreddit} (Time Range: {DEFAULT_TIME_RANGE})")
         post = get_random_quality_post(subreddit, DEFAULT_TIME_RANGE)
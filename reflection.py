@@ -3,6 +3,8 @@ import json
 from config import (
     REFLECTION_PROMPT, 
     REFLECTION_PROMPT_WITH_REDDIT,
+    REFLECTION_JSON_SCHEMA,
+    REFLECTION_MAX_TOKENS,
     REFLECTION_CHANCE,
     SHOULD_FORCE_REFLECTION_AFTER_K_CYCLES, 
     FORCE_REFLECTION_AFTER_K,
@@ -14,15 +16,20 @@ from state_of_mind import (
     get_followed_subreddits,
     update_state_from_json
 )
-from model import call_llm, embed_text
+from model import call_llm, embed_text, invalidate_prefix_cache, memory_snapshot
 from helpers import strip_surrounding_quotes, cosine_similarity
 from memory import memory_db
 from recent_perception import get_recent_perception
 import pickle
 from reddit_perception import search_reddit_embeddings
+from stop_conditions import json_object_closed
+from telemetry import traced
+from pipeline import side_tasks
 
-last_reflection_index = 0
+last_reflection_mark = (0, [])  # (memory log position, pending memory texts already gathered past it)
 cycles_since_last_reflection = 0
+_suggestions_future = None  # subreddit suggestions computed ahead by prefetch_subreddit_suggestions
+_planned_reflection = None  # should_reflect() drawn ahead by plan_reflection for the current cycle
 
 def should_reflect():
     global cycles_since_last_reflection
@@ -33,22 +40,65 @@ def should_reflect():
         
     return random.random() < REFLECTION_CHANCE
 
+def plan_reflection():
+    """Decide at the start of a cycle whether reflection will run.
+
+    When it will (and uses Reddit), the subreddit suggestion search starts right away so it
+    overlaps the perception LLM call; otherwise nothing is searched.
+    """
+    global _planned_reflection, _suggestions_future
+    _planned_reflection = should_reflect()
+    if _planned_reflection and "reddit" in PERCEPTION_SOURCES:
+        prefetch_subreddit_suggestions()
+    else:
+        _suggestions_future = None
+    return _planned_reflection
+
+def _take_reflection_decision():
+    global _planned_reflection
+    planned, _planned_reflection = _planned_reflection, None
+    return should_reflect() if planned is None else planned
+
+def prefetch_subreddit_suggestions():
+    """Start the subreddit suggestion search for the current summary in the background.
+
+    Only reflection changes the summary, so suggestions computed at the start of a cycle are
+    the ones reflection_phase would compute itself; this overlaps them with the perception LLM call.
+    """
+    global _suggestions_future
+    _suggestions_future = side_tasks.submit(search_reddit_embeddings, get_identity_summary(), 3)
+
+def get_subreddit_suggestions(summary):
+    global _suggestions_future
+    future, _suggestions_future = _suggestions_future, None
+    if future is not None:
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"❌ Prefetched subreddit suggestions failed: {e}")
+    return search_reddit_embeddings(summary, top_n=3)
+
 def gather_new_memories():
-    global last_reflection_index
+    global last_reflection_mark
     
-    entries = memory_db.entries
-    new_memories = [text for (text, vector) in entries[last_reflection_index:]]
-    
-    if len(new_memories) < 3:
-        return None
+    # Memories from the latest generations may still be queued on the background writer; ones
+    # merged into an existing memory bring that memory back as new
+    with memory_snapshot(vectors=False) as pending:
+        position, gathered = last_reflection_mark
+        stored, still_pending = memory_db.texts_seen_since(position, gathered)
+        new_memories = stored + [text for text, _ in pending[len(still_pending):]]
         
-    last_reflection_index = len(entries)
+        if len(new_memories) < 3:
+            return None
+            
+        last_reflection_mark = (memory_db.log_position, [text for text, _ in pending])
     return new_memories
 
+@traced()
 def reflection_phase():
     global cycles_since_last_reflection
     
-    if not should_reflect():
+    if not _take_reflection_decision():
         cycles_since_last_reflection += 1
         print("Reflection phase skipped (random chance).")
         return None
@@ -62,11 +112,11 @@ def reflection_phase():
     # Check if we're using Reddit perception
     using_reddit = "reddit" in PERCEPTION_SOURCES
     
-    summary = get_identity_summary()
-    top_subreddits = search_reddit_embeddings(summary, top_n=3)
-    subreddit_suggestions = ", ".join([f"r/{s}" for s in top_subreddits])
-    
     if using_reddit:
+        summary = get_identity_summary()
+        top_subreddits = get_subreddit_suggestions(summary)
+        subreddit_suggestions = ", ".join([f"r/{s}" for s in top_subreddits])
+        
         # Use the updated prompt format with Reddit preferences
         subreddits = get_followed_subreddits()
         
@@ -84,7 +134,10 @@ def reflection_phase():
             system_prompt="", 
             user_prompt=user_prompt, 
             response_type="reflection",
-            store_in_memory=False
+            store_in_memory=False,
+            max_tokens=REFLECTION_MAX_TOKENS,
+            stop_when=json_object_closed(),
+            json_schema=REFLECTION_JSON_SCHEMA
         )
         
         # Clean up the response to ensure it's valid JSON
@@ -99,6 +152,8 @@ def reflection_phase():
             update_successful = update_state_from_json(state_dict)
             
             if update_successful:
+                # Saved prompt-prefix states embed the old summary
+                invalidate_prefix_cache()
                 print(f"🔄 Updated state with new preferences: {len(state_dict['followed_subreddits'])} subreddits")
             else:
                 print("❌ Failed to update state from reflection response")
@@ -125,6 +180,7 @@ def reflection_phase():
         
         # Update the state
         set_identity_summary(new_summary)
+        invalidate_prefix_cache()
         cycles_since_last_reflection = 0
         
         return new_summary
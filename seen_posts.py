@@ -0,0 +1,126 @@
+# seen_posts.py
+# Tracks which dataset rows have already been perceived.
+#
+# The seen set is a bitmap over dataset row indices (bit i lives in byte i >> 3, position i & 7).
+# Marking a row appends its index to a journal (8 bytes, O(1) I/O) and fsyncs it; every
+# `compact_every` marks the bitmap is rewritten atomically and the journal truncated. Loading
+# replays the journal over the last bitmap snapshot, so a crash (including an OS crash or power
+# loss) loses at most the mark being written. Marks come one per perception, so the fsync is cheap.
+
+import os
+import threading
+import numpy as np
+
+BITMAP_FILENAME = "seen_posts.bitmap"
+JOURNAL_FILENAME = "seen_posts.journal"
+COMPACT_EVERY = 1000
+
+
+class SeenPostTracker:
+    def __init__(self, directory, compact_every=COMPACT_EVERY):
+        self.bitmap_path = os.path.join(directory, BITMAP_FILENAME)
+        self.journal_path = os.path.join(directory, JOURNAL_FILENAME)
+        self.compact_every = compact_every
+
+        self._bitmap = np.zeros(0, dtype=np.uint8)
+        self._count = 0
+        self._journal_entries = 0
+        self._journal = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, idx):
+        idx = int(idx)
+        byte = idx >> 3
+        return byte < len(self._bitmap) and bool((self._bitmap[byte] >> (idx & 7)) & 1)
+
+    def contains_many(self, indices) -> np.ndarray:
+        """Vectorised membership test: boolean array, True where the row index was seen."""
+        indices = np.asarray(indices, dtype=np.int64)
+        bytes_ = indices >> 3
+        in_range = bytes_ < len(self._bitmap)
+        seen = np.zeros(len(indices), dtype=bool)
+        if len(self._bitmap):
+            bits = self._bitmap[np.minimum(bytes_, len(self._bitmap) - 1)] >> (indices & 7).astype(np.uint8)
+            seen = in_range & (bits & 1).astype(bool)
+        return seen
+
+    def mark(self, idx):
+        """Mark a dataset row as seen (synced journal append; periodic compaction)."""
+        idx = int(idx)
+        with self._lock:
+            if idx in self:
+                return
+            self._set(idx)
+            if self._journal is None:
+                self._journal = open(self.journal_path, "ab")
+            self._journal.write(np.int64(idx).tobytes())
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal_entries += 1
+            if self._journal_entries >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    # ----------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------
+
+    def _set(self, idx):
+        byte = idx >> 3
+        if byte >= len(self._bitmap):
+            grown = np.zeros(max(byte + 1, 2 * len(self._bitmap)), dtype=np.uint8)
+            grown[:len(self._bitmap)] = self._bitmap
+            self._bitmap = grown
+        self._bitmap[byte] |= np.uint8(1 << (idx & 7))
+        self._count += 1
+
+    def _load(self):
+        if os.path.exists(self.bitmap_path):
+            self._bitmap = np.fromfile(self.bitmap_path, dtype=np.uint8)
+            self._count = int(np.unpackbits(self._bitmap).sum())
+
+        if os.path.exists(self.journal_path):
+            size = os.path.getsize(self.journal_path)
+            journal = np.fromfile(self.journal_path, dtype=np.int64, count=size // 8)
+            for idx in journal.tolist():
+                if idx not in self:
+                    self._set(idx)
+            self._journal_entries = len(journal)
+            if size % 8:
+                # Drop a partially written entry so new appends stay aligned
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(len(journal) * 8)
+
+        if self._count:
+            print(f"📝 Loaded {self._count} seen posts")
+
+    def _compact(self):
+        tmp_path = self.bitmap_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._bitmap.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.bitmap_path)
+
+        # The bitmap now holds every journaled mark; replaying them again would be harmless
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        with open(self.journal_path, "wb"):
+            pass
+        self._journal_entries = 0
@@ -1,37 +1,78 @@
+# state_of_mind.py
+# The agent's persistent state (identity summary, followed subreddits).
+#
+# The parsed state is kept in memory and only re-read when the file's (mtime, inode, size) stamp
+# changes, so the per-call getters cost a stat instead of an open + JSON parse. Writes go to a
+# temp file that is renamed over the state file, so a crash never leaves it half written.
+
 import os
+import copy
 import json
+import threading
+from telemetry import span
 from config import STATE_OF_MIND_PATH, STATE_OF_MIND_SEED, DEFAULT_SUBREDDITS, DEFAULT_TIME_RANGE
 
+_lock = threading.RLock()
+_state = None
+_stamp = None
+
+def _file_stamp():
+    try:
+        st = os.stat(STATE_OF_MIND_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+def _current_state():
+    """The cached state dict, re-read only if the file changed on disk (callers must not mutate it)."""
+    global _state, _stamp
+    with _lock:
+        stamp = _file_stamp()
+        if stamp is None:
+            _state = {
+                "summary": STATE_OF_MIND_SEED,
+                "followed_subreddits": DEFAULT_SUBREDDITS,
+            }
+            _write(_state)
+        elif stamp != _stamp or _state is None:
+            with span("state_read"), open(STATE_OF_MIND_PATH, "r", encoding="utf-8") as f:
+                _state = json.load(f)
+            _stamp = stamp
+        return _state
+
+def _write(state):
+    global _stamp
+    with span("state_write"):
+        os.makedirs(os.path.dirname(STATE_OF_MIND_PATH), exist_ok=True)
+        tmp_path = STATE_OF_MIND_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, STATE_OF_MIND_PATH)
+    _stamp = _file_stamp()
+
 def load_state_of_mind():
-    if not os.path.exists(STATE_OF_MIND_PATH):
-        state = {
-            "summary": STATE_OF_MIND_SEED,
-            "followed_subreddits": DEFAULT_SUBREDDITS,
-        }
-        save_state_of_mind(state)
-        return state
-        
-    with open(STATE_OF_MIND_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with _lock:
+        return copy.deepcopy(_current_state())
 
 def save_state_of_mind(state):
-    os.makedirs(os.path.dirname(STATE_OF_MIND_PATH), exist_ok=True)
-    
-    with open(STATE_OF_MIND_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2)
+    global _state
+    with _lock:
+        _state = copy.deepcopy(state)
+        _write(_state)
 
 def get_identity_summary():
-    state = load_state_of_mind()
-    return state.get("summary", "")
+    return _current_state().get("summary", "")
 
 def set_identity_summary(new_summary):
-    state = load_state_of_mind()
-    state["summary"] = new_summary
-    save_state_of_mind(state)
+    with _lock:
+        state = load_state_of_mind()
+        state["summary"] = new_summary
+        save_state_of_mind(state)
     
 def get_followed_subreddits():
-    state = load_state_of_mind()
-    return state.get("followed_subreddits", DEFAULT_SUBREDDITS)
+    return list(_current_state().get("followed_subreddits", DEFAULT_SUBREDDITS))
 
 def update_state_from_json(json_state):
     """Update the entire state from a JSON object (typically from reflection)"""
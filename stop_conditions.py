@@ -0,0 +1,97 @@
+# stop_conditions.py
+# Stop predicates for streamed generation.
+#
+# A predicate is called with the text generated so far and returns None to keep generating,
+# or the number of characters to keep when the output is complete (or out of spec), at which
+# point call_llm stops decoding.
+
+import re
+from typing import Callable, Optional
+
+StopPredicate = Callable[[str], Optional[int]]
+
+# A run of sentence-ending punctuation, optionally closed by quotes/brackets, before whitespace
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s|$)")
+
+
+def char_budget(limit: int) -> StopPredicate:
+    """Stop once the output exceeds `limit` characters, keeping the first `limit`."""
+    def check(text: str) -> Optional[int]:
+        return limit if len(text) > limit else None
+    return check
+
+
+def delimiters(*markers: str) -> StopPredicate:
+    """Stop at the first marker that appears after some content; the marker itself is dropped.
+
+    Leading whitespace and one marker at the very start (e.g. the "Tweet:" label the model
+    often opens with), plus the whitespace after it, are skipped before any marker is looked
+    for, so a label followed by a newline doesn't end the output when "\\n" is also a marker.
+    """
+    def check(text: str) -> Optional[int]:
+        body_start = len(text) - len(text.lstrip())
+        for marker in markers:
+            if marker.strip() and text.startswith(marker, body_start):
+                body_start += len(marker)
+                body_start += len(text[body_start:]) - len(text[body_start:].lstrip())
+                break
+        cut = None
+        for marker in markers:
+            pos = text.find(marker, body_start)
+            if pos != -1 and text[body_start:pos].strip() and (cut is None or pos < cut):
+                cut = pos
+        return cut
+    return check
+
+
+def trim_to_limit(text: str, limit: int) -> str:
+    """Shorten text to at most `limit` characters without cutting a word.
+
+    Ends on the last sentence boundary within the limit if that keeps at least half of it,
+    otherwise on the last word boundary; a single over-long word is cut hard.
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    window = text[:limit + 1]  # one character past the limit, so a boundary right at it counts
+    ends = [m.end() for m in _SENTENCE_END.finditer(window) if m.end() <= limit]
+    if ends and ends[-1] >= limit // 2:
+        return text[:ends[-1]]
+    space = max(window.rfind(c) for c in " \n\t")
+    if space > 0:
+        return text[:space].rstrip()
+    return text[:limit]
+
+
+def json_object_closed() -> StopPredicate:
+    """Stop right after the first top-level JSON object closes (braces inside strings ignored)."""
+    def check(text: str) -> Optional[int]:
+        depth = 0
+        in_string = False
+        escaped = False
+        for i, ch in enumerate(text):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}" and depth > 0:
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        return None
+    return check
+
+
+def any_of(*predicates: StopPredicate) -> StopPredicate:
+    """Combine predicates: stop at the earliest cut any of them asks for."""
+    def check(text: str) -> Optional[int]:
+        cuts = [cut for cut in (predicate(text) for predicate in predicates) if cut is not None]
+        return min(cuts) if cuts else None
+    return check
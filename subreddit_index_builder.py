@@ -0,0 +1,175 @@
+# subreddit_index_builder.py
+# Parallel, resumable rebuild of the subreddit post index from the Pushshift dataset.
+#
+# The dataset is split into shards of `checkpoint_interval` rows. Each shard is processed in a
+# worker process that reads Arrow record batches of only the needed columns and applies the
+# quality filters (score, body length, deleted/removed body) and the year extraction column-wise.
+# Every finished shard is saved as a checkpoint file, so an interrupted build resumes where it
+# stopped. When all shards exist they are merged into the columnar SubredditPostIndex.
+
+import os
+import json
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from config import MIN_SCORE, MIN_BODY_LENGTH
+from subreddit_post_index import SubredditPostIndex
+
+COLUMNS = ["subreddit", "created_utc", "score", "selftext"]
+DELETED_BODIES = ["[deleted]", "[removed]", "none", "null", ""]
+BATCH_ROWS = 100_000
+
+# Dataset handle for the current (worker) process
+_dataset = None
+
+
+def _load_dataset(dataset_name, split):
+    global _dataset
+    if _dataset is None:
+        import datasets
+        _dataset = datasets.load_dataset(
+            dataset_name,
+            split=split,
+            verification_mode="no_checks",
+            streaming=False
+        ).select_columns(COLUMNS).with_format("arrow")
+    return _dataset
+
+
+def filter_quality_batch(table: pa.Table, first_row: int):
+    """Apply the quality filters to one Arrow batch.
+
+    Mirrors is_quality_post and post_year in reddit_perception.py: score >= MIN_SCORE, a body of
+    at least MIN_BODY_LENGTH characters that is not a deleted/removed placeholder, a non-empty
+    subreddit and a created_utc timestamp. Returns (lowercase subreddit array, dataset row
+    indices, years) for the rows that pass.
+    """
+    subreddit = table.column("subreddit")
+    body = table.column("selftext")
+    created = table.column("created_utc")
+
+    mask = pc.fill_null(pc.greater(pc.utf8_length(subreddit), 0), False)
+    mask = pc.and_(mask, pc.fill_null(pc.greater_equal(table.column("score"), MIN_SCORE), False))
+    mask = pc.and_(mask, pc.fill_null(pc.greater_equal(pc.utf8_length(body), MIN_BODY_LENGTH), False))
+    placeholder = pc.is_in(pc.utf8_lower(pc.utf8_trim_whitespace(body)), value_set=pa.array(DELETED_BODIES))
+    mask = pc.and_(mask, pc.invert(pc.fill_null(placeholder, False)))
+    mask = pc.and_(mask, pc.fill_null(pc.not_equal(created, 0), False))
+
+    keep = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+    if len(keep) == 0:
+        return pa.array([], type=pa.string()), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int16)
+
+    rows = pa.array(keep)
+    seconds = np.asarray(created.take(rows).to_numpy(zero_copy_only=False), dtype=np.int64)
+    years = seconds.astype("datetime64[s]").astype("datetime64[Y]").astype(np.int64) + 1970  # UTC years
+    subreddits = pc.utf8_lower(subreddit.take(rows))
+    return subreddits, keep.astype(np.int64) + first_row, years.astype(np.int16)
+
+
+def index_shard(dataset_name, split, start, end, shard_path, batch_rows=BATCH_ROWS):
+    """Filter dataset rows [start, end) and save the passing posts as a checkpoint file."""
+    dataset = _load_dataset(dataset_name, split)
+    names: dict[str, int] = {}
+    codes, indices, years = [], [], []
+
+    for batch_start in range(start, end, batch_rows):
+        table = dataset[batch_start:min(batch_start + batch_rows, end)]
+        subreddits, batch_indices, batch_years = filter_quality_batch(table, batch_start)
+        if len(batch_indices) == 0:
+            continue
+        encoded = pc.dictionary_encode(subreddits).combine_chunks()
+        lookup = np.array([names.setdefault(name, len(names)) for name in encoded.dictionary.to_pylist()],
+                          dtype=np.int32)
+        codes.append(lookup[encoded.indices.to_numpy(zero_copy_only=False)])
+        indices.append(batch_indices)
+        years.append(batch_years)
+
+    tmp_path = shard_path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        names=np.array(list(names), dtype=str),
+        codes=np.concatenate(codes) if codes else np.zeros(0, dtype=np.int32),
+        indices=np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+        years=np.concatenate(years) if years else np.zeros(0, dtype=np.int16),
+    )
+    os.replace(tmp_path, shard_path)
+    return shard_path
+
+
+def merge_shards(shard_paths, index_dir) -> SubredditPostIndex:
+    """Merge shard checkpoints into one SubredditPostIndex, unifying their subreddit codes."""
+    names: dict[str, int] = {}
+    codes, indices, years = [], [], []
+    for path in shard_paths:
+        with np.load(path) as shard:
+            lookup = np.array([names.setdefault(name, len(names)) for name in shard["names"].tolist()],
+                              dtype=np.int64)
+            codes.append(lookup[shard["codes"]] if len(lookup) else shard["codes"].astype(np.int64))
+            indices.append(shard["indices"])
+            years.append(shard["years"])
+    return SubredditPostIndex.write_coded(
+        index_dir,
+        list(names),
+        np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64),
+        np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+        np.concatenate(years) if years else np.zeros(0, dtype=np.int16),
+    )
+
+
+def build_subreddit_index(dataset_name, split, index_dir, checkpoint_interval, workers=None) -> SubredditPostIndex:
+    """Rebuild the subreddit post index with a process pool, resuming from existing checkpoints."""
+    total = len(_load_dataset(dataset_name, split))
+    shard_dir = index_dir + ".build"
+    build_params = {
+        "dataset": dataset_name,
+        "split": split,
+        "rows": total,
+        "checkpoint_interval": checkpoint_interval,
+        "min_score": MIN_SCORE,
+        "min_body_length": MIN_BODY_LENGTH,
+    }
+
+    # Checkpoints are only reusable if they were produced with the same inputs and filters
+    params_path = os.path.join(shard_dir, "build.json")
+    if os.path.exists(params_path):
+        with open(params_path, "r", encoding="utf-8") as f:
+            if json.load(f) != build_params:
+                print("⚠️ Existing checkpoints were built with different settings, starting over.")
+                shutil.rmtree(shard_dir)
+    os.makedirs(shard_dir, exist_ok=True)
+    with open(params_path, "w", encoding="utf-8") as f:
+        json.dump(build_params, f)
+
+    shards = [
+        (start, min(start + checkpoint_interval, total), os.path.join(shard_dir, f"shard_{start:012d}.npz"))
+        for start in range(0, total, checkpoint_interval)
+    ]
+    pending = [shard for shard in shards if not os.path.exists(shard[2])]
+    print(f"🔄 Indexing {total} rows in {len(shards)} shards ({len(shards) - len(pending)} already checkpointed)")
+
+    started = time.time()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        for start, end, path in pending:
+            index_shard(dataset_name, split, start, end, path)
+            print(f"✅ Checkpointed rows {start}-{end} ({time.time() - started:.0f}s)")
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {
+                pool.submit(index_shard, dataset_name, split, start, end, path): (start, end)
+                for start, end, path in pending
+            }
+            for future in as_completed(futures):
+                future.result()
+                start, end = futures[future]
+                print(f"✅ Checkpointed rows {start}-{end} ({time.time() - started:.0f}s)")
+
+    index = merge_shards([path for _, _, path in shards], index_dir)
+    shutil.rmtree(shard_dir)
+    print(f"✅ Merged {len(shards)} shards into {index_dir} in {time.time() - started:.0f}s")
+    return index
@@ -0,0 +1,178 @@
+# subreddit_post_index.py
+# Columnar, memory-mapped subreddit -> quality post index (CSR layout).
+#
+# The index directory holds:
+#   manifest.json  - format version, subreddit count and total post count
+#   subreddits.json - subreddit names (lowercase); name i owns rows offsets[i]:offsets[i+1]
+#   offsets.i64    - int64 row offsets, len(subreddits) + 1
+#   indices.i64    - int64 dataset row index of each post
+#   years.i16      - int16 post year, sorted ascending within each subreddit's range
+#
+# Only the small name table is parsed on open; the per-post columns are memory-mapped, so
+# startup cost does not grow with the number of posts, and a year filter is a binary search.
+
+import os
+import json
+import numpy as np
+
+INDEX_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+NAMES_FILENAME = "subreddits.json"
+OFFSETS_FILENAME = "offsets.i64"
+INDICES_FILENAME = "indices.i64"
+YEARS_FILENAME = "years.i16"
+
+
+class SubredditPostIndex:
+    def __init__(self, names, offsets, indices, years):
+        self.names = names
+        self.offsets = offsets
+        self.indices = indices
+        self.years = years
+        self._slots = {name: i for i, name in enumerate(names)}
+
+    def __contains__(self, subreddit):
+        return subreddit in self._slots
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def total_posts(self):
+        return int(self.offsets[-1]) if len(self.offsets) else 0
+
+    def row_range(self, subreddit) -> tuple[int, int]:
+        """Return the [start, end) rows of a subreddit's posts (empty if unknown)."""
+        slot = self._slots.get(subreddit)
+        if slot is None:
+            return 0, 0
+        return int(self.offsets[slot]), int(self.offsets[slot + 1])
+
+    def year_range(self, subreddit, start_year, end_year) -> tuple[int, int]:
+        """Return the [start, end) rows of a subreddit's posts with start_year <= year <= end_year."""
+        start, end = self.row_range(subreddit)
+        years = self.years[start:end]
+        lo = int(np.searchsorted(years, start_year, side="left"))
+        hi = int(np.searchsorted(years, end_year, side="right"))
+        return start + lo, start + hi
+
+    def posts(self, subreddit, start_year=None, end_year=None) -> np.ndarray:
+        """Return a (read-only) view of dataset indices for a subreddit, optionally year-bounded."""
+        if start_year is None:
+            start, end = self.row_range(subreddit)
+        else:
+            start, end = self.year_range(subreddit, start_year, start_year if end_year is None else end_year)
+        return self.indices[start:end]
+
+    def validate(self) -> list[str]:
+        """Check structural invariants; returns a list of problems (empty if valid)."""
+        errors = []
+        if len(self.offsets) != len(self.names) + 1:
+            errors.append(f"Offset table has {len(self.offsets)} entries for {len(self.names)} subreddits.")
+            return errors
+        if len(self.offsets) and self.offsets[0] != 0:
+            errors.append("Offset table does not start at 0.")
+        if np.any(np.diff(self.offsets) < 0):
+            errors.append("Offset table is not monotonic.")
+        if self.total_posts != len(self.indices) or self.total_posts != len(self.years):
+            errors.append(f"Column lengths ({len(self.indices)}, {len(self.years)}) do not match {self.total_posts} posts.")
+        for i, name in enumerate(self.names):
+            years = self.years[self.offsets[i]:self.offsets[i + 1]]
+            if len(years) > 1 and np.any(np.diff(years) < 0):
+                errors.append(f"Years are not sorted for subreddit {name}.")
+        return errors
+
+    # ----------------------------------------------------------------------------------
+    # Persistence
+    # ----------------------------------------------------------------------------------
+
+    @classmethod
+    def exists(cls, index_dir):
+        return os.path.exists(os.path.join(index_dir, MANIFEST_FILENAME))
+
+    @classmethod
+    def open(cls, index_dir):
+        with open(os.path.join(index_dir, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported subreddit index version {manifest.get('version')}")
+        with open(os.path.join(index_dir, NAMES_FILENAME), "r", encoding="utf-8") as f:
+            names = json.load(f)
+
+        posts = manifest["posts"]
+        offsets = np.fromfile(os.path.join(index_dir, OFFSETS_FILENAME), dtype=np.int64)
+        if len(names) != manifest["subreddits"] or len(offsets) != len(names) + 1 or offsets[-1] != posts:
+            raise ValueError(f"Subreddit index at {index_dir} is inconsistent with its manifest")
+        indices = _open_column(os.path.join(index_dir, INDICES_FILENAME), np.int64, posts)
+        years = _open_column(os.path.join(index_dir, YEARS_FILENAME), np.int16, posts)
+        return cls(names, offsets, indices, years)
+
+    @classmethod
+    def write(cls, index_dir, subreddits, indices, years):
+        """Write an index from parallel per-post arrays (subreddit name, dataset index, year)."""
+        names, codes = np.unique(np.asarray(subreddits, dtype=str), return_inverse=True)
+        return cls.write_coded(index_dir, names.tolist(), codes, indices, years)
+
+    @classmethod
+    def write_coded(cls, index_dir, names, codes, indices, years):
+        """Write an index from per-post subreddit codes (positions in `names`), indices and years.
+
+        Posts are grouped by subreddit and sorted by (year, index) within each group.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        years = np.asarray(years, dtype=np.int16)
+
+        order = np.lexsort((indices, years, codes))
+        counts = np.bincount(codes, minlength=len(names))
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        os.makedirs(index_dir, exist_ok=True)
+        _write_atomic(os.path.join(index_dir, INDICES_FILENAME), indices[order].tobytes())
+        _write_atomic(os.path.join(index_dir, YEARS_FILENAME), years[order].tobytes())
+        _write_atomic(os.path.join(index_dir, OFFSETS_FILENAME), offsets.tobytes())
+        _write_atomic(os.path.join(index_dir, NAMES_FILENAME), json.dumps(list(names)).encode("utf-8"))
+        manifest = {"version": INDEX_VERSION, "subreddits": len(names), "posts": int(offsets[-1])}
+        _write_atomic(os.path.join(index_dir, MANIFEST_FILENAME), json.dumps(manifest).encode("utf-8"))
+        return cls.open(index_dir)
+
+    @classmethod
+    def from_mapping(cls, index_dir, subreddit_to_posts):
+        """Write an index from the legacy {subreddit: [(idx, year), ...]} mapping.
+
+        Entries whose idx or year cannot be converted to int are dropped.
+        """
+        names, codes, indices, years = [], [], [], []
+        dropped = 0
+        for subreddit in sorted(subreddit_to_posts):
+            code = len(names)
+            for item in subreddit_to_posts[subreddit]:
+                try:
+                    idx, year = int(item[0]), int(item[1])
+                except Exception:
+                    dropped += 1
+                    continue
+                codes.append(code)
+                indices.append(idx)
+                years.append(year)
+            if len(codes) and codes[-1] == code:
+                names.append(subreddit)  # subreddits left without valid posts get no code
+        if dropped:
+            print(f"Dropped {dropped} invalid entries while converting the subreddit index.")
+        return cls.write_coded(index_dir, names, codes, indices, years)
+
+
+def _open_column(path, dtype, length):
+    if length == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+
+def _write_atomic(path, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,119 @@
+# subreddit_search.py
+# Persistent FAISS index over subreddit-name embeddings, used for subreddit suggestions.
+#
+# Vectors are L2-normalised and searched by inner product (= cosine similarity). Small sets use
+# an exact flat index; above SUBREDDIT_INDEX_FLAT_MAX names an HNSW graph is built instead.
+# The index is loaded once per process; if only the embedding pickle from embed_cache.py
+# exists, the index is built from it on first use and saved next to it.
+
+import os
+import json
+import pickle
+import threading
+
+import faiss
+import numpy as np
+
+from config import REDDIT_CACHE_DIR, SUBREDDIT_INDEX_FLAT_MAX, SUBREDDIT_INDEX_HNSW_M, SUBREDDIT_INDEX_EF_SEARCH
+
+EMBEDDED_CACHE_FILENAME = os.path.join(REDDIT_CACHE_DIR, "embedded_subreddit_index.pkl")
+INDEX_FILENAME = os.path.join(REDDIT_CACHE_DIR, "embedded_subreddit_index.faiss")
+NAMES_FILENAME = os.path.join(REDDIT_CACHE_DIR, "embedded_subreddit_names.json")
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class SubredditIndex:
+    def __init__(self, index, names):
+        self.index = index
+        self.names = names
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = SUBREDDIT_INDEX_EF_SEARCH
+
+    @classmethod
+    def build(cls, names, vectors):
+        """Build an inner-product index over the given names and their embeddings."""
+        vectors = _normalize(vectors)
+        dim = vectors.shape[1]
+        if len(names) <= SUBREDDIT_INDEX_FLAT_MAX:
+            index = faiss.IndexFlatIP(dim)
+        else:
+            index = faiss.IndexHNSWFlat(dim, SUBREDDIT_INDEX_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.add(vectors)
+        return cls(index, list(names))
+
+    @classmethod
+    def from_embeddings_dict(cls, embeddings_dict):
+        names = list(embeddings_dict.keys())
+        vectors = np.stack([np.asarray(embeddings_dict[name], dtype=np.float32) for name in names])
+        return cls.build(names, vectors)
+
+    def save(self, index_path=None, names_path=None):
+        index_path = index_path or INDEX_FILENAME
+        names_path = names_path or NAMES_FILENAME
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(names_path, "w", encoding="utf-8") as f:
+            json.dump(self.names, f)
+        faiss.write_index(self.index, index_path)
+
+    @classmethod
+    def load(cls, index_path=None, names_path=None):
+        index = faiss.read_index(index_path or INDEX_FILENAME)
+        with open(names_path or NAMES_FILENAME, "r", encoding="utf-8") as f:
+            names = json.load(f)
+        if index.ntotal != len(names):
+            raise ValueError(f"Subreddit index has {index.ntotal} vectors but {len(names)} names")
+        return cls(index, names)
+
+    def search(self, vector, k=3):
+        """Return up to k (subreddit, cosine similarity) pairs, most similar first."""
+        if self.index.ntotal == 0 or k <= 0:
+            return []
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))
+        scores, ids = self.index.search(query, min(k, self.index.ntotal))
+        return [(self.names[i], float(s)) for s, i in zip(scores[0], ids[0]) if i >= 0]
+
+
+_subreddit_index: SubredditIndex | None = None
+_subreddit_index_lock = threading.Lock()
+
+
+def get_subreddit_index() -> SubredditIndex | None:
+    """Load the subreddit index once per process, building it from the embedding pickle if needed."""
+    global _subreddit_index
+    if _subreddit_index is None:
+        with _subreddit_index_lock:
+            if _subreddit_index is None:
+                _subreddit_index = _load_or_build()
+    return _subreddit_index
+
+
+def _load_or_build() -> SubredditIndex | None:
+    index_is_current = (
+        os.path.exists(INDEX_FILENAME)
+        and os.path.exists(NAMES_FILENAME)
+        and (not os.path.exists(EMBEDDED_CACHE_FILENAME)
+             or os.path.getmtime(INDEX_FILENAME) >= os.path.getmtime(EMBEDDED_CACHE_FILENAME))
+    )
+    if index_is_current:
+        index = SubredditIndex.load()
+        print(f"✅ Loaded subreddit search index ({index.index.ntotal} subreddits)")
+        return index
+
+    if not os.path.exists(EMBEDDED_CACHE_FILENAME):
+        print(f"❌ Embedded subreddit index file not found: {EMBEDDED_CACHE_FILENAME}")
+        return None
+
+    print(f"🔄 Building subreddit search index from {EMBEDDED_CACHE_FILENAME}...")
+    with open(EMBEDDED_CACHE_FILENAME, "rb") as f:
+        embeddings_dict = pickle.load(f)
+    if not embeddings_dict:
+        return None
+    index = SubredditIndex.from_embeddings_dict(embeddings_dict)
+    index.save()
+    print(f"✅ Subreddit search index saved to {INDEX_FILENAME} ({index.index.ntotal} subreddits)")
+    return index
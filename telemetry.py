@@ -0,0 +1,226 @@
+# telemetry.py
+# Lightweight tracing and metrics for the agent loop.
+#
+# `span(name, **attrs)` times a block. Spans nest per thread (each record carries its parent's id)
+# and attributes can be added while the span is open (`s.set(tokens=...)`). Finished spans are
+# buffered and appended to a JSONL trace file; their durations also feed per-span metrics, and
+# `observe` / `inc` record extra values (token counts, throughput). `write_metrics_snapshot()`
+# rewrites a Prometheus text-format file with everything recorded so far.
+#
+# With TELEMETRY_ENABLED = False, span() returns a shared no-op object and nothing is recorded.
+
+import os
+import json
+import time
+import atexit
+import itertools
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from config import TELEMETRY_ENABLED, TRACE_PATH, METRICS_PATH
+
+TRACE_FLUSH_RECORDS = 256
+# Upper bounds (seconds) of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    __slots__ = ("count", "total", "buckets")
+
+    def __init__(self, buckets=None):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(buckets) if buckets else None
+
+
+class Telemetry:
+    def __init__(self, trace_path=TRACE_PATH, metrics_path=METRICS_PATH, enabled=TELEMETRY_ENABLED):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._buffer: list[str] = []
+        self._durations: dict[str, _Metric] = {}
+        self._values: dict[tuple[str, str], _Metric] = {}  # keyed by (name, rendered labels)
+        self._counters: dict[tuple[str, str], float] = {}
+        if enabled:
+            atexit.register(self.flush)
+
+    # ----------------------------------------------------------------------------------
+    # Recording
+    # ----------------------------------------------------------------------------------
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        stack = self._stack()
+        record = Span(name, next(self._ids), stack[-1].id if stack else None, attrs)
+        stack.append(record)
+        try:
+            yield record
+        except BaseException as e:
+            record.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            record.finish()
+            stack.pop()
+            self._record(record)
+
+    def observe(self, name, value, **labels):
+        """Record one value of a summary metric (e.g. tokens per second), optionally labelled."""
+        if not self.enabled:
+            return
+        key = (name, _render_labels(labels))
+        with self._lock:
+            metric = self._values.get(key)
+            if metric is None:
+                metric = self._values[key] = _Metric()
+            metric.count += 1
+            metric.total += value
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _render_labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, record):
+        line = json.dumps(record.to_dict(), default=str)
+        with self._lock:
+            metric = self._durations.get(record.name)
+            if metric is None:
+                metric = self._durations[record.name] = _Metric(DURATION_BUCKETS)
+            metric.count += 1
+            metric.total += record.duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if record.duration <= bound:
+                    metric.buckets[i] += 1
+                    break
+            self._buffer.append(line)
+            flush = len(self._buffer) >= TRACE_FLUSH_RECORDS
+        if flush:
+            self.flush()
+
+    # ----------------------------------------------------------------------------------
+    # Output
+    # ----------------------------------------------------------------------------------
+
+    def flush(self):
+        """Append buffered span records to the trace file."""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+        with open(self.trace_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def write_metrics_snapshot(self):
+        """Rewrite the Prometheus text-format metrics file (atomically) and flush the trace."""
+        if not self.enabled:
+            return
+        self.flush()
+        lines = [
+            "# HELP agent_span_duration_seconds Time spent in traced operations.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, metric in sorted(self._durations.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, metric.buckets):
+                    cumulative += count
+                    lines.append(f'agent_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'agent_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {metric.count}')
+                lines.append(f'agent_span_duration_seconds_sum{{span="{name}"}} {metric.total:.6f}')
+                lines.append(f'agent_span_duration_seconds_count{{span="{name}"}} {metric.count}')
+            previous = None
+            for (name, labels), metric in sorted(self._values.items()):
+                if name != previous:
+                    lines.append(f"# TYPE agent_{name} summary")
+                    previous = name
+                lines.append(f"agent_{name}_sum{labels} {metric.total:.6f}")
+                lines.append(f"agent_{name}_count{labels} {metric.count}")
+            previous = None
+            for (name, labels), value in sorted(self._counters.items()):
+                if name != previous:
+                    lines.append(f"# TYPE agent_{name}_total counter")
+                    previous = name
+                lines.append(f"agent_{name}_total{labels} {value}")
+
+        os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.metrics_path)
+
+
+class Span:
+    __slots__ = ("name", "id", "parent", "attrs", "start_wall", "start", "duration")
+
+    def __init__(self, name, span_id, parent, attrs):
+        self.name = name
+        self.id = span_id
+        self.parent = parent
+        self.attrs = attrs
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self):
+        return {
+            "ts": self.start_wall,
+            "span": self.name,
+            "id": self.id,
+            "parent": self.parent,
+            "thread": threading.current_thread().name,
+            "duration_ms": round(self.duration * 1000, 3),
+            **self.attrs,
+        }
+
+
+def _render_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+telemetry = Telemetry()
+span = telemetry.span
+
+
+def traced(name=None):
+    """Decorator: run the function inside a span (named after the function by default)."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with telemetry.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,44 @@
+from stop_conditions import delimiters, trim_to_limit
+
+SHORT_TWEET_STOP = delimiters("\n", "Tweet:")
+
+
+def test_label_then_newline_keeps_tweet():
+    text = 'Tweet:\n"hello world"\n'
+    cut = SHORT_TWEET_STOP(text)
+    assert text[:cut] == 'Tweet:\n"hello world"'
+
+
+def test_label_line_alone_keeps_generating():
+    assert SHORT_TWEET_STOP("Tweet:\n") is None
+    assert SHORT_TWEET_STOP("  Tweet: ") is None
+
+
+def test_second_label_ends_tweet():
+    text = "Tweet: first thought Tweet: second"
+    assert text[:SHORT_TWEET_STOP(text)] == "Tweet: first thought "
+
+
+def test_unlabelled_newline_ends_tweet():
+    text = "\nhello world\nmore"
+    assert text[:SHORT_TWEET_STOP(text)] == "\nhello world"
+
+
+def test_trim_keeps_short_text():
+    assert trim_to_limit("  short enough.  ", 280) == "short enough."
+
+
+def test_trim_ends_on_sentence_boundary():
+    text = "First sentence here. Second one runs past the limit by a lot"
+    assert trim_to_limit(text, 40) == "First sentence here."
+
+
+def test_trim_ends_on_word_boundary():
+    text = "one two three four five six seven"
+    trimmed = trim_to_limit(text, 16)
+    assert trimmed == "one two three"
+    assert len(trimmed) <= 16
+
+
+def test_trim_cuts_single_long_word():
+    assert trim_to_limit("x" * 50, 10) == "x" * 10
@@ -7,17 +7,21 @@ from config import (
     NUM_MEMORIES_FOR_TWEET,
     SIMILARITY_THRESHOLD,
     TWEET_TEMPERATURES,
-    TWEET_MAX_TOKENS
+    TWEET_MAX_TOKENS,
+    TWEET_CHAR_BUDGET,
+    TWEET_CHAR_LIMIT,
+    TWEET_STOP_DELIMITERS
 )
 from state_of_mind import get_identity_summary
 from recent_perception import get_recent_perception
-from model import call_llm, embed_text
+from model import call_llm, embed_text, memory_snapshot
 from memory import memory_db
-from helpers import cosine_similarity
+from stop_conditions import any_of, char_budget, delimiters, trim_to_limit
+from helpers import strip_surrounding_quotes
+from telemetry import traced
+from pipeline import background_writes
 import os
 import random
-import numpy as np
-import math
 
 def get_diverse_recent_memories(n=NUM_MEMORIES_FOR_TWEET, threshold=SIMILARITY_THRESHOLD):
     """Retrieve a diverse set of recent memories using cosine similarity.
@@ -29,87 +33,30 @@ def get_diverse_recent_memories(n=NUM_MEMORIES_FOR_TWEET, threshold=SIMILARITY_T
     Returns:
         List of diverse memory texts in chronological order
     """
-    entries = memory_db.entries[::-1]  # Reverse for most recent first
-    selected = []
-    selected_vecs = []
-    
-    # First pass: Try to get n diverse memories with strict threshold
-    for text, vector in entries:
-        if not selected:
-            selected.append(text)
-            selected_vecs.append(vector)
-        else:
-            # Only add if this memory is sufficiently different from all selected ones
-            if all(cosine_similarity(vector, v) < threshold for v in selected_vecs):
-                selected.append(text)
-                selected_vecs.append(vector)
-        
-        if len(selected) >= n:
-            break
-    
-    # Second pass: If we don't have enough memories, relax the threshold gradually
-    if len(selected) < n and len(entries) >= n:
-        print(f"🧠 Only found {len(selected)} diverse memories with threshold {threshold}, relaxing criteria...")
-        remaining_slots = n - len(selected)
-        relaxed_entries = [entry for entry in entries if entry[0] not in selected]
-        
-        # For each remaining slot, find the most diverse entry from the remaining pool
-        for _ in range(remaining_slots):
-            if not relaxed_entries:
-                break
-                
-            # Find the memory that's most different from the current selection
-            best_entry = None
-            lowest_max_similarity = float('inf')
-            
-            for text, vector in relaxed_entries:
-                if not selected_vecs:  # If we somehow have no vectors yet
-                    best_entry = (text, vector)
-                    break
-                    
-                # Calculate max similarity to any existing memory
-                max_similarity = max(cosine_similarity(vector, v) for v in selected_vecs)
-                
-                if max_similarity < lowest_max_similarity:
-                    lowest_max_similarity = max_similarity
-                    best_entry = (text, vector)
-            
-            if best_entry:
-                text, vector = best_entry
-                selected.append(text)
-                selected_vecs.append(vector)
-                relaxed_entries.remove(best_entry)
+    # Memories still queued on the background writer count as the newest ones
+    with memory_snapshot() as pending:
+        selected = memory_db.diverse_recent_search(n=n, threshold=threshold, pending=pending)
     
     # Sort chronologically (most recent last)
     return selected[::-1]
 
 def get_top_memories(query_text, a=0.9, b=0.6, k=5, decay='linear'):
-    """Return up to k memories ordered so the highest-scoring one is last."""
-    if not memory_db.entries:
-        return []
+    """Return up to k memories ordered so the highest-scoring one is last.
 
+    Scores are a * similarity (mapped to 0…1) + b * recency, computed by MemoryDB in one pass.
+    """
     query_emb = embed_text(query_text)
-    total     = len(memory_db.entries)
-    scored    = []
+    with memory_snapshot() as pending:
+        top = memory_db.recency_weighted_search(query_emb, k=k, a=a, b=b, decay=decay, pending=pending)
+    return [text for text, _ in reversed(top)]  # best last
 
-    for idx, (text, vec) in enumerate(memory_db.entries):  # oldest → newest
-        sim = cosine_similarity(vec, query_emb)            # −1 … 1
-        # optional: map to 0…1
-        sim = 0.5 * (1 + sim)
-
-        # recency score
-        age   = total - idx                                # newest ⇒ total
-        if decay == 'exp':
-            rec = math.exp(-0.1 * age)                     # exponential
-        else:  # linear
-            rec = age / total
-
-        score = a * sim + b * rec
-        scored.append((score, text))
-
-    top = sorted(scored, key=lambda t: t[0], reverse=True)[:k]
-    top_sorted = sorted(top, key=lambda t: t[0])           # best last
-    return [text for _, text in top_sorted]
+def clean_tweet(text, mode):
+    """Drop a leading "Tweet:" label and surrounding quotes, then fit the mode's length limit."""
+    text = text.strip()
+    if text.lower().startswith("tweet:"):
+        text = text[len("tweet:"):].strip()
+    text = strip_surrounding_quotes(text).strip()
+    return trim_to_limit(text, TWEET_CHAR_LIMIT[mode])
 
 def choose_tweet_length_mode():
     r = random.random()
@@ -122,6 +69,7 @@ def choose_tweet_length_mode():
             
     return TWEET_LENGTH_MODES[-1][0]  # Fallback to last
 
+@traced()
 def tweet_phase(current_perception=None):
     current_summary = get_identity_summary()
     if current_perception is None:
@@ -145,13 +93,19 @@ def tweet_phase(current_perception=None):
         user_prompt=user_prompt, 
         response_type="tweet", 
         temperature=TWEET_TEMPERATURES[mode],
-        max_tokens=TWEET_MAX_TOKENS[mode]
+        max_tokens=TWEET_MAX_TOKENS[mode],
+        stop_when=any_of(char_budget(TWEET_CHAR_BUDGET[mode]), delimiters(*TWEET_STOP_DELIMITERS[mode])),
+        postprocess=lambda reply: clean_tweet(reply, mode)
     )
     
+    # Appending to the tweet log overlaps the next cycle's generation
+    background_writes.submit(_append_generated_tweet, mode, tweet)
+        
+    return tweet
+
+def _append_generated_tweet(mode, tweet):
     # Ensure consistent tweet storage format
     os.makedirs(os.path.dirname(GENERATED_TWEETS_PATH), exist_ok=True)
     with open(GENERATED_TWEETS_PATH, "a", encoding="utf-8") as f:
         # The quotes are explicitly added here to make format consistent
-        f.write(f'{mode} tweet --> "{tweet}"\n\n')
-        
-    return tweet 
\ No newline at end of file
+        f.write(f'{mode} tweet --> "{tweet}"\n\n') 
\ No newline at end of file